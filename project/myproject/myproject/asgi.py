@@ -3,6 +3,10 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The kitchen board stream (``orders.views.kitchen_events``) needs an ASGI
+server, e.g. ``uvicorn myproject.asgi:application``: idle Server-Sent Events
+connections are coroutines here instead of blocked worker threads.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,132 @@
+"""Варианты загруженных изображений: миниатюры фиксированного размера в WebP и JPEG.
+
+Файлы кладутся рядом с оригиналом под именем с хэшем содержимого:
+
+    dishes/borsch.jpg -> dishes/borsch.3f9a1c2b7d4e.320w.webp, ...
+
+Такие имена не меняются, пока не изменился файл, поэтому их можно
+отдавать с бессрочным кэшированием (Cache-Control: immutable).
+Описание вариантов хранится в JSON-поле модели (Dish.image_variants,
+CustomUser.avatar_variants) и строится при сохранении (orders/signals.py)
+или командой build_image_variants для старых записей. Неудачная сборка
+тоже записывается ({'source': ..., 'failed': True}), чтобы каждое
+сохранение не пыталось снова; при смене файла старые варианты удаляются.
+"""
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# widths - ширины вариантов в пикселях, ratio - пропорции кадра (ширина, высота)
+ImageSpec = namedtuple('ImageSpec', ['widths', 'ratio'])
+
+DISH_IMAGE = ImageSpec(widths=(320, 640, 960), ratio=(4, 3))
+AVATAR = ImageSpec(widths=(100, 200, 400), ratio=(1, 1))
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'progressive': True, 'optimize': True},
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def variant_name(source, digest, width, ext):
+    stem, _ = os.path.splitext(source)
+    return f'{stem}.{digest}.{width}w.{ext}'
+
+
+def build_variants(source, spec, storage=default_storage):
+    """Создает недостающие варианты файла source и возвращает их описание:
+
+    {'source': имя оригинала, 'size': [ширина, высота] наибольшего варианта,
+     'webp': [[ширина, имя], ...], 'jpeg': [[ширина, имя], ...]}
+
+    Верхнеуровневая функция без обращения к базе - ее можно отдавать
+    в пул процессов.
+    """
+    with storage.open(source, 'rb') as f:
+        data = f.read()
+    digest = content_hash(data)
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    image = image.convert('RGB')
+
+    # Не увеличиваем: ширины больше оригинала отбрасываются, наименьшая остается всегда
+    widths = [width for width in spec.widths if width <= image.width] or [min(spec.widths)]
+    variants = {'source': source, 'size': None}
+    for ext in FORMATS:
+        variants[ext] = []
+    for width in widths:
+        height = round(width * spec.ratio[1] / spec.ratio[0])
+        thumbnail = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        variants['size'] = [width, height]
+        for ext, options in FORMATS.items():
+            name = variant_name(source, digest, width, ext)
+            if not storage.exists(name):
+                buffer = BytesIO()
+                thumbnail.save(buffer, **options)
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            variants[ext].append([width, name])
+    return variants
+
+
+def failed_variants(source):
+    """Описание для файла, из которого варианты построить не удалось"""
+    return {'source': source, 'failed': True}
+
+
+def variant_files(variants):
+    return {name for ext in FORMATS for _, name in (variants or {}).get(ext, [])}
+
+
+def delete_variants(names, storage=default_storage):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить вариант %s', name, exc_info=True)
+
+
+def refresh_variants(field_file, variants, spec):
+    """Описание вариантов для текущего файла поля; пересобирается при смене файла.
+
+    Новая загрузка сначала сохраняется в хранилище, чтобы варианты
+    легли рядом с окончательным именем оригинала. Ошибки чтения
+    изображения не мешают сохранению записи - остается оригинал.
+    Варианты прежнего файла удаляются после коммита.
+    """
+    if field_file and not field_file._committed:
+        field_file.save(field_file.name, field_file.file, save=False)
+    source = field_file.name if field_file else None
+    if variants and variants.get('source') == source:
+        return variants
+
+    if not field_file:
+        new_variants = {}
+    else:
+        try:
+            new_variants = build_variants(source, spec, field_file.storage)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.warning('Не удалось построить варианты для %s', source, exc_info=True)
+            new_variants = failed_variants(source)
+
+    stale = variant_files(variants) - variant_files(new_variants)
+    if stale:
+        storage = field_file.storage if field_file else default_storage
+        transaction.on_commit(lambda: delete_variants(stale, storage))
+    return new_variants
+
+
+def srcset(variants, ext, storage=default_storage):
+    """Строка srcset: "url 320w, url 640w" """
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in variants.get(ext, []))
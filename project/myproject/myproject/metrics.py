@@ -0,0 +1,140 @@
+"""Метрики запросов: время представления, число и время SQL, повторы запросов.
+
+RequestMetricsMiddleware добавляет заголовок Server-Timing и копит
+последние REQUEST_METRICS_WINDOW замеров по каждому представлению.
+Сводку отдает request_metrics_view (только для администраторов).
+SQL считается через connection.execute_wrapper, DEBUG не нужен.
+Доля замеряемых запросов - REQUEST_METRICS_SAMPLE_RATE.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000]
+
+_IN_LIST = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+
+
+def fingerprint(sql):
+    """Форма запроса: списки IN (%s, %s, ...) любой длины совпадают"""
+    return _IN_LIST.sub('(...)', sql)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+class QueryCollector:
+    """execute_wrapper: считает запросы и их время в рамках одного запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class RequestMetrics:
+    """Скользящее окно замеров по имени представления"""
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.window))
+            self.duplicates = defaultdict(Counter)
+
+    def record(self, view_name, duration, collector):
+        with self.lock:
+            self.samples[view_name].append((duration, collector.count, collector.duration))
+            for sql, count in collector.duplicates().items():
+                self.duplicates[view_name][sql] += count
+
+    def snapshot(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+            duplicates = {name: counter.most_common(5) for name, counter in self.duplicates.items()}
+
+        result = {}
+        for name, values in samples.items():
+            timings = [duration * 1000 for duration, _, _ in values]
+            histogram = Counter()
+            for ms in timings:
+                bucket = next((f'<{limit}ms' for limit in HISTOGRAM_BUCKETS_MS if ms < limit),
+                              f'>={HISTOGRAM_BUCKETS_MS[-1]}ms')
+                histogram[bucket] += 1
+            result[name] = {
+                'count': len(values),
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'avg_queries': round(sum(count for _, count, _ in values) / len(values), 2),
+                'avg_sql_ms': round(sum(sql for _, _, sql in values) * 1000 / len(values), 2),
+                'histogram': dict(histogram),
+                'duplicated_queries': [{'sql': sql, 'count': count} for sql, count in duplicates.get(name, [])],
+            }
+        return result
+
+
+metrics = RequestMetrics(getattr(settings, 'REQUEST_METRICS_WINDOW', 500))
+
+
+class RequestMetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        metrics.record(match.view_name if match else '<unresolved>', duration, collector)
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={collector.duration * 1000:.1f};desc="{collector.count} queries"'
+        )
+        return response
+
+
+def request_metrics_view(request):
+    """Сводка метрик в JSON; ?reset=1 очищает окно"""
+    user = request.user
+    if not user.is_authenticated or not (user.is_superuser or user.is_admin()):
+        raise PermissionDenied('Только для администраторов')
+    data = metrics.snapshot()
+    if request.GET.get('reset'):
+        metrics.reset()
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
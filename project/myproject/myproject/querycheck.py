@@ -0,0 +1,101 @@
+"""Поиск N+1: один и тот же SQL (с точностью до параметров) повторяется
+больше порога за один запрос или блок кода.
+
+    with assert_no_repeated_queries():
+        client.get(url)
+
+RepeatedQueriesMiddleware делает то же для каждого запроса в режиме
+разработки и пишет в лог стек вызова, с которого начались повторы.
+Порог по умолчанию - настройка NPLUSONE_THRESHOLD.
+"""
+import logging
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 5
+
+# Служебные запросы транзакций не считаем
+_IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+
+def get_threshold(threshold=None):
+    if threshold is not None:
+        return threshold
+    return getattr(settings, 'NPLUSONE_THRESHOLD', DEFAULT_THRESHOLD)
+
+
+def _project_stack():
+    """Кадры стека из кода проекта, без Django и библиотек"""
+    frames = traceback.extract_stack()[:-3]
+    own = [frame for frame in frames if str(settings.BASE_DIR) in frame.filename
+           and 'site-packages' not in frame.filename]
+    return ''.join(traceback.format_list(own or frames[-10:]))
+
+
+class RepeatedQueries:
+    """execute_wrapper, запоминающий повторы и место первого лишнего повтора"""
+
+    def __init__(self, threshold=None):
+        self.threshold = get_threshold(threshold)
+        self.counts = {}
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(_IGNORED_PREFIXES):
+            key = fingerprint(sql)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if self.counts[key] == self.threshold + 1:
+                self.stacks[key] = _project_stack()
+        return execute(sql, params, many, context)
+
+    @property
+    def repeated(self):
+        return {sql: count for sql, count in self.counts.items() if count > self.threshold}
+
+    def report(self):
+        lines = []
+        for sql, count in self.repeated.items():
+            lines.append(f'{count}x: {sql}\n{self.stacks[sql]}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_repeated_queries(threshold=None):
+    """Собирает повторы SQL внутри блока; результат - в .repeated и .report()"""
+    detector = RepeatedQueries(threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+
+
+@contextmanager
+def assert_no_repeated_queries(threshold=None):
+    """AssertionError, если какой-то SQL повторился больше порога"""
+    with detect_repeated_queries(threshold) as detector:
+        yield detector
+    if detector.repeated:
+        raise AssertionError(
+            f'Запросы повторяются больше {detector.threshold} раз (N+1):\n{detector.report()}'
+        )
+
+
+class RepeatedQueriesMiddleware:
+    """Режим разработки: пишет в лог N+1 с трассировкой стека"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_repeated_queries() as detector:
+            response = self.get_response(request)
+        if detector.repeated:
+            logger.warning('N+1 в %s %s:\n%s', request.method, request.path, detector.report())
+        return response
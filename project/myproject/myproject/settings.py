@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'myproject.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +59,11 @@ MIDDLEWARE = [
     
 ]
 
+# Поиск N+1 (myproject/querycheck.py): порог повторов одного SQL за запрос
+NPLUSONE_THRESHOLD = 5
+if DEBUG:
+    MIDDLEWARE.append('myproject.querycheck.RepeatedQueriesMiddleware')
+
 ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
@@ -79,13 +87,99 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# База выбирается переменными окружения:
+#   DB_ENGINE=sqlite (по умолчанию) | postgres
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE - сколько секунд держать соединение (postgres)
+#   DB_POOL=1, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE - пул psycopg вместо постоянных соединений
+#   DB_SQLITE_TIMEOUT - сколько секунд ждать блокировку записи (sqlite)
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'canteen'),
+            'USER': os.environ.get('DB_USER', 'canteen'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
+    if os.environ.get('DB_POOL') == '1':
+        # Пул (psycopg[pool]) несовместим с постоянными соединениями Django
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': 10,
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL: чтение не ждет записи; NORMAL в WAL не теряет целостность при сбое
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                # busy_timeout: писатель ждет освобождения блокировки, а не падает сразу
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+                # BEGIN IMMEDIATE: блокировка записи берется в начале транзакции.
+                # Иначе транзакция, начавшая с SELECT (как place_order), получает
+                # "database is locked" при переходе к записи, без ожидания busy_timeout
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Неизвестный DB_ENGINE: {DB_ENGINE!r} (ожидается sqlite или postgres)')
+
+# Кэш (меню и т.п.). Локальная память процесса - работает без внешних сервисов,
+# но у каждого worker'а свой: при нескольких процессах нужен REDIS_URL
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'canteen',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'canteen-sessions',
+    },
 }
 
+# Общий кэш и кэш сессий для нескольких процессов (нужен пакет redis)
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'canteen',
+    }
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Хранение сессий: SESSION_BACKEND=db | cached_db | cache.
+# cache - клик по корзине вообще не пишет в базу; cached_db - пишет, но читает из кэша.
+# Оба режима только с общим кэшем (REDIS_URL): кэш в памяти процесса у каждого
+# worker'а свой, и сессии в нем расходятся или теряются.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db' if REDIS_URL else 'db')
+if SESSION_BACKEND not in ('db', 'cached_db', 'cache'):
+    raise ImproperlyConfigured(f'Неизвестный SESSION_BACKEND: {SESSION_BACKEND!r} (ожидается db, cached_db или cache)')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Метрики запросов (myproject/metrics.py): доля замеряемых запросов и размер окна
+REQUEST_METRICS_SAMPLE_RATE = 1.0
+REQUEST_METRICS_WINDOW = 500
+
+# Брокер событий заказов для доски кухни (orders/events.py)
+ORDER_EVENTS_BROKER = 'orders.events.InProcessBroker'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,307 @@
+import os
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+import orders.urls
+import users.urls
+from orders.models import Category, DailySales, Dish, Order, OrderItem, TimeSlot
+from orders.services import DishUnavailable, place_order
+from users.models import CustomUser
+from .metrics import fingerprint, metrics
+from .querycheck import assert_no_repeated_queries, detect_repeated_queries
+
+
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        cls.student = CustomUser.objects.create_user('student', password='pass', role='student')
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('menu'))
+        self.assertRegex(response['Server-Timing'], r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    def test_dump_is_admin_only(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+
+    def test_dump_aggregates_by_view(self):
+        self.client.force_login(self.admin)
+        for _ in range(3):
+            self.client.get(reverse('my_orders'))
+        data = self.client.get(reverse('request_metrics')).json()
+        self.assertEqual(data['my_orders']['count'], 3)
+        self.assertGreater(data['my_orders']['avg_queries'], 0)
+        self.assertEqual(sum(data['my_orders']['histogram'].values()), 3)
+
+
+class RepeatedQueriesGuardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user('student', password='pass', role='student')
+        category = Category.objects.create(name='Супы')
+        cls.dishes = [
+            Dish.objects.create(name=f'Блюдо {i}', description='', price=10, category=category)
+            for i in range(10)
+        ]
+        cls.order = Order.objects.create(customer=cls.student, status='preparing')
+        for dish in cls.dishes:
+            OrderItem.objects.create(order=cls.order, dish=dish, quantity=1, price_at_time=dish.price)
+
+    def test_detects_n_plus_one(self):
+        with detect_repeated_queries(threshold=3) as detector:
+            for item in OrderItem.objects.all():
+                item.dish.name
+        self.assertEqual(list(detector.repeated.values()), [10])
+        self.assertIn('tests.py', detector.report())
+
+    def test_assertion_fails_on_n_plus_one(self):
+        with self.assertRaises(AssertionError):
+            with assert_no_repeated_queries(threshold=3):
+                for item in OrderItem.objects.all():
+                    item.dish.name
+
+    def test_assertion_passes_with_select_related(self):
+        with assert_no_repeated_queries(threshold=3):
+            for item in OrderItem.objects.select_related('dish'):
+                item.dish.name
+
+
+class AllUrlsRepeatedQueriesTests(TestCase):
+    """Каждый URL из orders/urls.py и users/urls.py без N+1 на непустых данных"""
+    ITEMS = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user('student', password='pass', role='student')
+        cls.chef = CustomUser.objects.create_user('chef', password='pass', role='chef')
+        cls.admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        for i in range(cls.ITEMS):
+            CustomUser.objects.create_user(f'user{i}', password='pass')
+        categories = [Category.objects.create(name=f'Категория {i}') for i in range(cls.ITEMS)]
+        cls.dishes = [
+            Dish.objects.create(name=f'Блюдо {i}', description='', price=10, category=category)
+            for i, category in enumerate(categories)
+        ]
+        cls.orders = []
+        for _ in range(cls.ITEMS):
+            order = Order.objects.create(customer=cls.student, status='preparing', total_price=80)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, dish=dish, quantity=1, price_at_time=dish.price) for dish in cls.dishes
+            )
+            cls.orders.append(order)
+
+    def setUp(self):
+        cache.clear()
+
+    def url_cases(self):
+        order_id = {'order_id': self.orders[0].id}
+        dish_id = {'dish_id': self.dishes[0].id}
+        menu_csv = 'category,name,price\n' + ''.join(f'{d.category.name},{d.name},11\n' for d in self.dishes)
+        # имя URL: (пользователь, метод, kwargs, данные)
+        return {
+            'menu': (None, 'get', {}, {}),
+            'view_cart': (self.student, 'get', {}, {}),
+            'add_to_cart': (self.student, 'post', dish_id, {}),
+            'update_cart': (self.student, 'post', dish_id, {'quantity': '2'}),
+            'remove_from_cart': (self.student, 'get', dish_id, {}),
+            'cart_api': (self.student, 'get', {}, {}),
+            'cart_add_api': (self.student, 'post', dish_id, {'quantity': '2'}),
+            'cart_update_api': (self.student, 'post', dish_id, {'quantity': '3'}),
+            'cart_remove_api': (self.student, 'post', dish_id, {}),
+            'create_order': (self.student, 'post', {}, {}),
+            'my_orders': (self.student, 'get', {}, {}),
+            'my_orders_api': (self.student, 'get', {}, {}),
+            'order_detail': (self.student, 'get', order_id, {}),
+            'cancel_order': (self.student, 'post', order_id, {}),
+            'update_order_status': (self.chef, 'post', order_id, {'status': 'ready'}),
+            'admin_dashboard': (self.admin, 'get', {}, {}),
+            'manage_dishes': (self.admin, 'get', {}, {}),
+            'import_menu_upload': (self.admin, 'post', {}, {'file': SimpleUploadedFile('menu.csv', menu_csv.encode())}),
+            'manage_orders': (self.admin, 'get', {}, {}),
+            'manage_users': (self.admin, 'get', {}, {}),
+            'reports': (self.admin, 'get', {}, {}),
+            'reports_export': (self.admin, 'get', {}, {'report': 'orders', 'format': 'xlsx'}),
+            'change_user_role': (self.admin, 'post', {'user_id': self.student.id}, {'role': 'student'}),
+            'chef_orders': (self.chef, 'get', {}, {}),
+            'chef_mark_ready': (self.chef, 'post', {}, {'order_ids': [order.id for order in self.orders]}),
+            'kitchen_summary': (self.chef, 'get', {}, {}),
+            'kitchen_summary_api': (self.chef, 'get', {}, {}),
+            'kitchen_events': (self.chef, 'get', {}, {}),
+            'profile': (self.student, 'get', {}, {}),
+            'register': (None, 'get', {}, {}),
+            'login': (None, 'get', {}, {}),
+            'logout': (self.student, 'get', {}, {}),
+            'user_list': (self.admin, 'get', {}, {}),
+            'user_detail': (self.admin, 'get', {'user_id': self.student.id}, {}),
+            'user_detail_self': (self.student, 'get', {}, {}),
+            'edit_profile': (self.student, 'get', {}, {}),
+            'password_reset': (None, 'get', {}, {}),
+            'password_reset_done': (None, 'get', {}, {}),
+            'password_reset_confirm': (None, 'get', {'uidb64': 'MQ', 'token': 'set-password'}, {}),
+            'password_reset_complete': (None, 'get', {}, {}),
+        }
+
+    def test_every_url_is_covered(self):
+        names = {pattern.name for pattern in orders.urls.urlpatterns + users.urls.urlpatterns}
+        self.assertEqual(names, set(self.url_cases()))
+
+    def test_no_repeated_queries(self):
+        for name, (user, method, kwargs, data) in self.url_cases().items():
+            with self.subTest(url=name):
+                self.client.logout()
+                if user is not None:
+                    self.client.force_login(user)
+                    session = self.client.session
+                    session['cart'] = {str(dish.id): 1 for dish in self.dishes}
+                    session.save()
+                with assert_no_repeated_queries(threshold=3):
+                    response = getattr(self.client, method)(reverse(name, kwargs=kwargs), data)
+                self.assertLess(response.status_code, 400)
+
+
+class SQLiteFileTestCase(SimpleTestCase):
+    """Параллельные писатели на файловой SQLite с настройками проекта.
+
+    Тестовая база в памяти не показывает блокировки файла, поэтому каждый
+    поток открывает свое соединение к временному файлу с теми же OPTIONS.
+    """
+    WRITERS = 8
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Только для SQLite')
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.settings_dict = {**connection.settings_dict, 'NAME': os.path.join(tmpdir.name, 'db.sqlite3')}
+
+    def open_connection(self, alias='sqlite_concurrency'):
+        # Соединение регистрируется в connections только для текущего потока
+        connections[alias] = DatabaseWrapper(self.settings_dict, alias)
+        return alias
+
+    def run_writers(self, target, writers=None, alias='sqlite_concurrency'):
+        errors = []
+
+        def worker(number):
+            self.open_connection(alias)
+            try:
+                target(alias, number)
+            except OperationalError as e:
+                errors.append(str(e))
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(writers or self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+
+class SQLiteConcurrencyTests(SQLiteFileTestCase):
+    TRANSACTIONS = 25
+
+    def test_pragmas_applied_on_connect(self):
+        alias = self.open_connection()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertGreater(cursor.fetchone()[0], 0)
+        finally:
+            connections[alias].close()
+
+    def test_parallel_read_then_write_transactions(self):
+        alias = self.open_connection()
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (writer INTEGER, seq INTEGER)')
+        connections[alias].close()
+
+        def write(alias, number):
+            for _ in range(self.TRANSACTIONS):
+                # Как place_order: сначала чтение, затем запись в одной транзакции
+                with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM counter WHERE writer = %s', [number])
+                    seq = cursor.fetchone()[0]
+                    cursor.execute('INSERT INTO counter (writer, seq) VALUES (%s, %s)', [number, seq])
+
+        errors = self.run_writers(write)
+
+        self.assertEqual(errors, [])
+        alias = self.open_connection()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*), COUNT(DISTINCT writer || \'-\' || seq) FROM counter')
+                self.assertEqual(cursor.fetchone(), (self.WRITERS * self.TRANSACTIONS,) * 2)
+        finally:
+            connections[alias].close()
+
+
+class StockConcurrencyTests(SQLiteFileTestCase):
+    # place_order работает с default: в потоках он подменяется соединением
+    # к временному файлу, тестовая база основного потока не затрагивается
+    databases = {'default'}
+
+    def test_parallel_buyers_do_not_oversell(self):
+        buyers, stock = 50, 10
+
+        def create_schema(alias, number):
+            with connections[alias].schema_editor() as editor:
+                for model in (CustomUser, Category, Dish, TimeSlot, Order, OrderItem, DailySales):
+                    editor.create_model(model)
+            CustomUser.objects.bulk_create(
+                [CustomUser(username=f'buyer{n}', role='student') for n in range(buyers)]
+            )
+            category = Category.objects.create(name='Супы')
+            Dish.objects.create(name='Борщ', description='', price=50, category=category, stock=stock)
+
+        self.assertEqual(self.run_writers(create_schema, writers=1, alias='default'), [])
+
+        start = threading.Barrier(buyers)
+        sold, refused = [], []
+
+        def buy(alias, number):
+            customer = CustomUser.objects.get(username=f'buyer{number}')
+            dish_id = Dish.objects.values_list('id', flat=True).get()
+            start.wait()
+            try:
+                sold.append(place_order(customer, {dish_id: 1}).pk)
+            except DishUnavailable:
+                refused.append(number)
+
+        errors = self.run_writers(buy, writers=buyers, alias='default')
+
+        self.assertEqual(errors, [])
+        self.assertEqual((len(sold), len(refused)), (stock, buyers - stock))
+        result = {}
+
+        def check(alias, number):
+            result['dish'] = Dish.objects.values('stock', 'is_available').get()
+            result['orders'] = Order.objects.count()
+
+        self.run_writers(check, writers=1, alias='default')
+        self.assertEqual(result, {'dish': {'stock': 0, 'is_available': False}, 'orders': stock})
@@ -2,11 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import request_metrics_view
 
 urlpatterns = [
     path('', include('orders.urls')),
     path('admin/', admin.site.urls),
     path('users/', include('users.urls')),
+    path('metrics/', request_metrics_view, name='request_metrics'),
     
 ]
 # Для обслуживания медиа файлов в разработке
@@ -1,23 +1,53 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 
-from .models import Category, Dish, Order, OrderItem
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, DailySales, DemandForecast, Dish, Order, OrderItem, TimeSlot,
+)
+from .services import close_sold_out, set_stock
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
     search_fields = ['name']
 
+class DishAdminForm(forms.ModelForm):
+    """Остаток меняется только явно - отдельным UPDATE (services.set_stock)"""
+    new_stock = forms.IntegerField(min_value=0, required=False, label='Установить остаток',
+                                   help_text='Пусто - остаток не меняется; 0 снимает блюдо с продажи')
+    untrack_stock = forms.BooleanField(required=False, label='Не учитывать остаток')
+
+    class Meta:
+        model = Dish
+        exclude = ['stock']
+
 @admin.register(Dish)
 class DishAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'is_available']
+    list_display = ['name', 'category', 'price', 'stock', 'is_available']
     list_filter = ['category', 'is_available']
     search_fields = ['name', 'description']
     list_editable = ['price', 'is_available']
+    form = DishAdminForm
+    readonly_fields = ['stock']
     
     def save_model(self, request, obj, form, change):
         if not obj.pk:  # Если объект создается впервые
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
+            super().save_model(request, obj, form, change)
+        else:
+            # Остаток в объекте прочитан до сохранения и мог устареть:
+            # place_order списывает его UPDATE'ом, поэтому save его не пишет
+            obj.save(update_fields=[
+                field.name for field in obj._meta.concrete_fields if not field.primary_key and field.name != 'stock'
+            ])
+        if form.cleaned_data.get('untrack_stock'):
+            set_stock(obj.pk, None)
+        elif form.cleaned_data.get('new_stock') is not None:
+            set_stock(obj.pk, form.cleaned_data['new_stock'])
+        # Доступность сверяется с текущим остатком: блюдо могло распродаться, пока форма была открыта
+        if close_sold_out([obj.pk]):
+            obj.is_available = False
+            self.message_user(request, f'У "{obj.name}" не осталось порций - блюдо снято с продажи', messages.WARNING)
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -25,8 +55,58 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'customer', 'status', 'total_price', 'created_at']
+    list_display = ['id', 'customer', 'status', 'total_price', 'slot', 'created_at']
+    list_select_related = ['customer', 'slot']
     list_filter = ['status', 'created_at']
     search_fields = ['customer__username', 'customer__email']
     inlines = [OrderItemInline]
     readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'dish', 'orders', 'cancelled', 'quantity', 'revenue']
+    list_filter = ['date']
+    list_select_related = ['dish']
+    date_hierarchy = 'date'
+    # Сводка считается из заказов (orders/sales.py), руками не правится
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['dish', 'dish_name', 'quantity', 'price_at_time']
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'customer', 'status', 'total_price', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['customer__username', 'customer__email']
+    list_select_related = ['customer']
+    inlines = [ArchivedOrderItemInline]
+    # Архив пополняется командой archive_orders и не редактируется
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(admin.ModelAdmin):
+    list_display = ['date', 'dish', 'expected', 'recommended', 'created_at']
+    list_filter = ['date']
+    list_select_related = ['dish']
+    date_hierarchy = 'date'
+
+@admin.register(TimeSlot)
+class TimeSlotAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'capacity', 'reserved', 'is_active']
+    list_editable = ['capacity', 'is_active']
+    list_filter = ['is_active']
+    date_hierarchy = 'starts_at'
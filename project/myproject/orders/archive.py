@@ -0,0 +1,95 @@
+"""Архив завершенных заказов.
+
+Готовые и отмененные заказы старше ARCHIVE_AFTER_DAYS дней переносятся
+из Order/OrderItem в ArchivedOrder/ArchivedOrderItem (команда
+archive_orders). Перенос идет пачками по первичному ключу: копия и
+удаление пачки - одна транзакция, так что заказ всегда лежит ровно в
+одной из таблиц. Рабочие таблицы, по которым строятся очередь кухни и
+списки заказов, остаются небольшими.
+
+Архив хранится в той же базе с теми же id, поэтому история ученика
+(customer_history) и страница заказа (find_order) читают обе таблицы.
+Сводка продаж DailySales при архивации не меняется.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .pagination import ORDERS_PAGE_SIZE, paginate_history
+
+ARCHIVE_AFTER_DAYS = 180
+# В архив попадают только заказы, которые уже не сменят статус
+ARCHIVE_STATUSES = ['ready', 'cancelled']
+DEFAULT_BATCH_SIZE = 1000
+
+_ORDER_FIELDS = ['id', 'customer_id', 'status', 'total_price', 'created_at', 'updated_at',
+                 'notes', 'item_count', 'items_summary']
+
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS):
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Переносит в архив пачку самых старых подходящих заказов; возвращает их число"""
+    with transaction.atomic():
+        orders = list(archivable(cutoff).order_by('pk').values(*_ORDER_FIELDS)[:batch_size])
+        if not orders:
+            return 0
+        order_ids = [order['id'] for order in orders]
+        items = (
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .order_by('pk')
+            .values_list('order_id', 'dish_id', 'dish__name', 'quantity', 'price_at_time')
+        )
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(order_id=order_id, dish_id=dish_id, dish_name=dish_name,
+                              quantity=quantity, price_at_time=price)
+            for order_id, dish_id, dish_name, quantity, price in items
+        ])
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(orders)
+
+
+def archive_orders(cutoff, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Переносит все подходящие заказы; on_batch(перенесено всего) после каждой пачки"""
+    moved = 0
+    while batch := archive_batch(cutoff, batch_size):
+        moved += batch
+        if on_batch:
+            on_batch(moved)
+    return moved
+
+
+def customer_history(customer, cursor=None, page_size=ORDERS_PAGE_SIZE):
+    """Страница истории ученика по рабочей таблице и архиву сразу"""
+    return paginate_history(
+        [Order.objects.filter(customer=customer), ArchivedOrder.objects.filter(customer=customer)],
+        cursor, page_size,
+    )
+
+
+def find_order(order_id):
+    """Заказ с покупателем и позициями из рабочей таблицы или архива; None, если нет нигде"""
+    sources = [
+        (Order, OrderItem.objects.select_related('dish')),
+        (ArchivedOrder, ArchivedOrderItem.objects.all()),
+    ]
+    for model, items in sources:
+        order = (
+            model.objects.select_related('customer')
+            .prefetch_related(Prefetch('items', queryset=items))
+            .filter(pk=order_id).first()
+        )
+        if order is not None:
+            return order
+    return None
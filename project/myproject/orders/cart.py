@@ -0,0 +1,133 @@
+from decimal import Decimal
+
+from .models import Dish
+from .menu_cache import get_menu
+
+# Больше порций одного блюда в корзину не положить
+MAX_CART_QUANTITY = 10
+
+
+class Cart:
+    """Корзина ученика в сессии.
+
+    Хранится компактной строкой "dish_id:quantity,..." (например "12:3,45:1"),
+    пустая корзина ключа в сессии не занимает. Старый формат
+    {"dish_id": quantity} читается и переписывается при следующем сохранении.
+    """
+    SESSION_KEY = 'cart'
+
+    def __init__(self, session):
+        self.session = session
+        self.data = self.decode(session.get(self.SESSION_KEY))
+
+    @staticmethod
+    def decode(raw):
+        """{dish_id: quantity} из строки или старого словаря; мусор пропускается"""
+        if not raw:
+            return {}
+        if isinstance(raw, dict):
+            pairs = raw.items()
+        else:
+            pairs = (part.partition(':')[::2] for part in str(raw).split(','))
+        data = {}
+        for dish_id, quantity in pairs:
+            try:
+                dish_id, quantity = int(dish_id), int(quantity)
+            except (TypeError, ValueError):
+                continue
+            if quantity > 0:
+                data[dish_id] = quantity
+        return data
+
+    @staticmethod
+    def encode(data):
+        return ','.join(f'{dish_id}:{quantity}' for dish_id, quantity in data.items())
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def __contains__(self, dish_id):
+        return int(dish_id) in self.data
+
+    def save(self):
+        if self.data:
+            self.session[self.SESSION_KEY] = self.encode(self.data)
+        elif self.SESSION_KEY in self.session:
+            del self.session[self.SESSION_KEY]
+
+    def add(self, dish_id, quantity=1):
+        dish_id = int(dish_id)
+        self.data[dish_id] = min(self.data.get(dish_id, 0) + quantity, MAX_CART_QUANTITY)
+        self.save()
+
+    def update(self, dish_id, quantity):
+        """Устанавливает количество; 0 и меньше убирает блюдо"""
+        if quantity > 0:
+            self.data[int(dish_id)] = quantity
+        else:
+            self.data.pop(int(dish_id), None)
+        self.save()
+
+    def remove(self, dish_id):
+        if self.data.pop(int(dish_id), None) is None:
+            return False
+        self.save()
+        return True
+
+    def clear(self):
+        self.data = {}
+        self.save()
+
+    def quantities(self):
+        return dict(self.data)
+
+    def summary(self):
+        """Строки и итог по снимку меню из кэша, без запросов к базе.
+
+        Возвращает ({dish_id: {'quantity', 'total'}}, total). Недоступные
+        блюда пропускаются - из сессии их убирает load().
+        """
+        prices = {dish.id: dish.price for dish in get_menu()['dishes']}
+        lines = {}
+        total = Decimal('0')
+        for dish_id, quantity in self.data.items():
+            if dish_id in prices:
+                lines[dish_id] = {'quantity': quantity, 'total': prices[dish_id] * quantity}
+                total += lines[dish_id]['total']
+        return lines, total
+
+    def load(self):
+        """Позиции корзины, загруженные одним запросом in_bulk.
+
+        Недоступные и удаленные блюда убираются из корзины.
+        Возвращает (items, total, unavailable), где unavailable -
+        названия убранных блюд.
+        """
+        quantities = self.quantities()
+        dishes = Dish.objects.in_bulk(list(quantities))
+        items = []
+        total = Decimal('0')
+        unavailable = []
+
+        for dish_id, quantity in quantities.items():
+            dish = dishes.get(dish_id)
+            if dish is None or not dish.is_available:
+                if dish is not None:
+                    unavailable.append(dish.name)
+                continue
+            item_total = dish.price * quantity
+            items.append({
+                'dish': dish,
+                'quantity': quantity,
+                'total': item_total,
+            })
+            total += item_total
+
+        data = {item['dish'].id: item['quantity'] for item in items}
+        if data != self.data:
+            self.data = data
+            self.save()
+        return items, total, unavailable
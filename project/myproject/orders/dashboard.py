@@ -0,0 +1,92 @@
+"""Статистика для панели администратора.
+
+Счетчики считаются четырьмя агрегирующими запросами (заказы - по рабочей
+таблице и архиву), продажи за неделю -
+двумя запросами к сводке DailySales (orders/sales.py), без просмотра
+истории заказов. Результат кэшируется ненадолго; изменения заказов,
+блюд и пользователей сбрасывают кэш (см. signals.py).
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Case, Count, DateTimeField, F, Q, When
+from django.utils import timezone
+
+from users.models import CustomUser
+from . import archive, sales, slots
+from .models import ArchivedOrder, Dish, Order
+
+DASHBOARD_CACHE_KEY = 'dashboard:stats'
+DASHBOARD_CACHE_TIMEOUT = 30
+# Сколько дней показывать в продажах и сколько блюд в топе
+SALES_DAYS = 7
+TOP_DISHES = 5
+
+
+def get_dashboard_stats():
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_CACHE_KEY, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+
+def compute_dashboard_stats():
+    roles = dict(
+        CustomUser.objects.order_by().values_list('role').annotate(count=Count('id'))
+    )
+
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    placed_today = Q(created_at__gte=today)
+    # Предзаказ ждет слота до передачи на кухню - готовка считается с нее
+    cooking_started = Case(
+        When(slot__isnull=False, then=F('slot__starts_at') - timedelta(minutes=slots.PREP_LEAD_MINUTES)),
+        default=F('created_at'),
+        output_field=DateTimeField(),
+    )
+    orders = Order.objects.aggregate(
+        total_orders=Count('id'),
+        active_orders=Count('id', filter=Q(status__in=Order.ACTIVE_STATUSES)),
+        # Время от передачи на кухню до отметки "Готово" для сегодняшних заказов
+        avg_prep_time=Avg(F('updated_at') - cooking_started, filter=placed_today & Q(status='ready')),
+        **{
+            f'{status}_orders': Count('id', filter=Q(status=status))
+            for status, _ in Order.STATUS_CHOICES
+        },
+    )
+    # Архивные заказы завершены: добавляются к общему числу и своим статусам
+    archived = ArchivedOrder.objects.aggregate(
+        total_orders=Count('id'),
+        **{f'{status}_orders': Count('id', filter=Q(status=status)) for status in archive.ARCHIVE_STATUSES},
+    )
+    for key, count in archived.items():
+        orders[key] += count
+
+    week_end = today.date()
+    week_start = week_end - timedelta(days=SALES_DAYS - 1)
+    by_day = {day: values for day, *values in sales.totals_by_day(week_start, week_end)}
+    sales_days = [
+        # (день, заказов, отменено, порций, выручка)
+        (day, *by_day.get(day, (0, 0, 0, 0)))
+        for day in (week_start + timedelta(days=i) for i in range(SALES_DAYS))
+    ]
+
+    return {
+        'total_students': roles.get('student', 0),
+        'total_chefs': roles.get('chef', 0),
+        'total_admins': roles.get('admin', 0),
+        'total_dishes': Dish.objects.count(),
+        **orders,
+        'revenue_today': sales_days[-1][4],
+        'sales_days': sales_days,
+        'revenue_week': sum(row[4] for row in sales_days),
+        'top_dishes': list(sales.totals_by_dish(week_start, week_end)[:TOP_DISHES]),
+        'avg_prep_minutes': (
+            round(orders['avg_prep_time'].total_seconds() / 60)
+            if orders['avg_prep_time'] is not None else None
+        ),
+    }
@@ -0,0 +1,96 @@
+"""События заказов для живой доски кухни (Server-Sent Events).
+
+Представления публикуют события через publish(), а потоковый
+endpoint kitchen_events подписывается на брокер. По умолчанию брокер
+живет в памяти процесса; для нескольких процессов его можно заменить
+через настройку ORDER_EVENTS_BROKER (например, на брокер поверх
+Redis pub/sub) - нужен класс с методами publish/subscribe/unsubscribe.
+"""
+import asyncio
+import json
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROKER = 'orders.events.InProcessBroker'
+
+
+class InProcessBroker:
+    """Pub/sub в памяти процесса.
+
+    Каждый подписчик - asyncio.Queue в своем event loop, поэтому
+    publish() можно вызывать из синхронных представлений в любом потоке.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {sub for sub in self._subscribers if sub[1] is not queue}
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Loop подписчика уже закрыт
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning('Подписчик не успевает читать события, событие пропущено')
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'ORDER_EVENTS_BROKER', DEFAULT_BROKER))()
+
+
+def publish(name, data):
+    """Публикует событие после коммита текущей транзакции"""
+    event = {'event': name, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def order_created(order, items):
+    """items - список пар (dish, quantity)"""
+    publish('order_created', {
+        'id': order.id,
+        'status': order.status,
+        'customer': order.customer.username,
+        'total_price': order.total_price,
+        'created_at': order.created_at,
+        'item_count': order.item_count,
+        'items_summary': order.items_summary,
+        'items': [{'dish': dish.name, 'quantity': quantity} for dish, quantity in items],
+    })
+
+
+def order_updated(order_id, status):
+    publish('order_updated', {'id': order_id, 'status': status})
+
+
+def format_sse(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event['event']}\ndata: {data}\n\n"
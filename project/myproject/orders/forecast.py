@@ -0,0 +1,106 @@
+"""Прогноз спроса на блюда по дням недели.
+
+Модель - взвешенное скользящее среднее по тому же дню недели: для
+каждого блюда и дня недели берутся продажи за HISTORY_WEEKS недель из
+сводки DailySales (в ней учтены и архивные заказы), свежие недели
+весят больше (вес вдвое меньше каждые HALF_LIFE_WEEKS недель). Дни до
+первой продажи блюда и дни, когда столовая не работала (ни одного
+заказа), не учитываются. Вместе со средним считается разброс;
+рекомендация - среднее плюс SAFETY_Z стандартных отклонений,
+округленное вверх.
+
+Обучение - несколько операций над массивом блюда × недели × дни недели,
+без циклов по блюдам. NumPy нужен только команде forecast_demand:
+страницы читают готовые строки DemandForecast.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+
+from .models import DailySales, DemandForecast, Dish
+
+HISTORY_WEEKS = 52
+HALF_LIFE_WEEKS = 4
+# Примерно в 80% дней спрос не превысит рекомендацию
+SAFETY_Z = 0.84
+
+
+def load_history(start, weeks):
+    """(dish_ids, sales блюда × дни, is_open по дням) за weeks недель с start"""
+    days = weeks * 7
+    end = start + timedelta(days=days - 1)
+    origin = start.toordinal()
+    period = DailySales.objects.filter(date__gte=start, date__lte=end)
+
+    is_open = np.zeros(days, dtype=bool)
+    open_days = [day.toordinal() - origin for day in period.filter(dish__isnull=True, orders__gt=0)
+                 .values_list('date', flat=True)]
+    is_open[open_days] = True
+
+    rows = np.array(
+        [(dish_id, day.toordinal() - origin, quantity) for dish_id, day, quantity in
+         period.filter(dish__isnull=False).values_list('dish_id', 'date', 'quantity').iterator(chunk_size=5000)],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    dish_ids, dish_index = np.unique(rows[:, 0], return_inverse=True)
+    sales = np.zeros((len(dish_ids), days))
+    sales[dish_index, rows[:, 1]] = np.maximum(rows[:, 2], 0)
+    return dish_ids, sales, is_open
+
+
+def train(sales, is_open, half_life=HALF_LIFE_WEEKS):
+    """Среднее и стандартное отклонение спроса, обе формы блюда × 7.
+
+    sales - блюда × дни (целое число недель, последний день - самый
+    свежий), is_open - работала ли столовая в этот день. Столбец j
+    результата - день недели, как у дня j истории.
+    """
+    dishes, days = sales.shape
+    weeks = days // 7
+    # Блюдо учитывается с первой продажи, чтобы новые блюда не тянули нули
+    first_sale = np.where(sales.any(axis=1), np.argmax(sales > 0, axis=1), days)
+    counted = (np.arange(days) >= first_sale[:, None]) & is_open
+    weeks_ago = np.arange(weeks)[::-1]
+    weights = counted.reshape(dishes, weeks, 7) * (0.5 ** (weeks_ago / half_life))[None, :, None]
+
+    values = sales.reshape(dishes, weeks, 7)
+    total = weights.sum(axis=1)
+    has_data = total > 0
+    mean = np.divide((weights * values).sum(axis=1), total, out=np.zeros_like(total), where=has_data)
+    spread = (weights * (values - mean[:, None, :]) ** 2).sum(axis=1)
+    variance = np.divide(spread, total, out=np.zeros_like(total), where=has_data)
+    return mean, np.sqrt(variance)
+
+
+def forecast(first_day, days=1, weeks=HISTORY_WEEKS, half_life=HALF_LIFE_WEEKS):
+    """Несохраненные DemandForecast на days (до 7) дней с first_day для доступных блюд"""
+    days = min(max(days, 1), 7)
+    # История кончается накануне first_day: день j истории - тот же день недели, что first_day + j
+    dish_ids, sales, is_open = load_history(first_day - timedelta(weeks=weeks), weeks)
+    if not len(dish_ids):
+        return []
+    mean, std = train(sales, is_open, half_life)
+
+    available = set(Dish.objects.filter(pk__in=dish_ids.tolist(), is_available=True).values_list('id', flat=True))
+    recommended = np.ceil(mean + SAFETY_Z * std)
+    return [
+        DemandForecast(
+            date=first_day + timedelta(days=offset), dish_id=int(dish_id),
+            expected=round(float(mean[row, offset]), 1), recommended=int(recommended[row, offset]),
+        )
+        for row, dish_id in enumerate(dish_ids)
+        if dish_id in available
+        for offset in range(days)
+        if mean[row, offset] > 0
+    ]
+
+
+def save_forecast(first_day, days=1, **options):
+    """Пересчитывает и сохраняет прогноз на дни first_day..first_day + days - 1; возвращает число строк"""
+    rows = forecast(first_day, days, **options)
+    with transaction.atomic():
+        DemandForecast.objects.filter(date__gte=first_day, date__lt=first_day + timedelta(days=days)).delete()
+        DemandForecast.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,57 @@
+"""Сводка для кухни: сколько порций каждого блюда нужно приготовить.
+
+Считается одним GROUP BY по позициям заказов со статусом 'preparing'
+и кэшируется на несколько секунд; изменения заказов сбрасывают кэш
+(см. signals.py). Здесь же - прогноз спроса на день для страницы
+повара (готовые строки DemandForecast, см. forecast.py).
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import DailySales, DemandForecast, OrderItem
+
+KITCHEN_SUMMARY_CACHE_KEY = 'kitchen:summary'
+KITCHEN_SUMMARY_TIMEOUT = 5
+
+
+def get_kitchen_summary():
+    summary = cache.get(KITCHEN_SUMMARY_CACHE_KEY)
+    if summary is None:
+        summary = compute_kitchen_summary()
+        cache.set(KITCHEN_SUMMARY_CACHE_KEY, summary, KITCHEN_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_kitchen_summary():
+    cache.delete(KITCHEN_SUMMARY_CACHE_KEY)
+
+
+def compute_kitchen_summary():
+    """[{'dish_id', 'dish_name', 'category_id', 'category_name', 'quantity', 'orders'}, ...]"""
+    return list(
+        OrderItem.objects.filter(order__status='preparing')
+        .values(
+            'dish_id',
+            dish_name=F('dish__name'),
+            category_id=F('dish__category_id'),
+            category_name=F('dish__category__name'),
+        )
+        .annotate(quantity=Sum('quantity'), orders=Count('order_id', distinct=True))
+        .order_by('category_name', 'dish_name')
+    )
+
+
+def get_day_forecast(day=None):
+    """Прогноз на день рядом с уже заказанным:
+    [{'dish_name', 'category_name', 'expected', 'recommended', 'ordered'}, ...]"""
+    day = day or timezone.localdate()
+    ordered = dict(
+        DailySales.objects.filter(date=day, dish__isnull=False).values_list('dish_id', 'quantity')
+    )
+    rows = (
+        DemandForecast.objects.filter(date=day)
+        .values('dish_id', 'expected', 'recommended', dish_name=F('dish__name'), category_name=F('dish__category__name'))
+        .order_by('category_name', 'dish_name')
+    )
+    return [{**row, 'ordered': ordered.get(row['dish_id'], 0)} for row in rows]
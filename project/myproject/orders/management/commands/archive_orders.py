@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from orders import archive
+from orders.dashboard import invalidate_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Переносит готовые и отмененные заказы старше N дней в архив пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.ARCHIVE_AFTER_DAYS,
+                            help='Архивировать заказы старше стольких дней')
+        parser.add_argument('--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+                            help='Сколько заказов переносить одной транзакцией')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать подходящие заказы')
+
+    def handle(self, *args, **options):
+        cutoff = archive.archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f'Будет перенесено заказов: {count} (созданы до {cutoff:%Y-%m-%d %H:%M})')
+            return
+
+        moved = archive.archive_orders(
+            cutoff, max(options['batch_size'], 1),
+            on_batch=lambda moved: self.stdout.write(f'  заказов: {moved}'),
+        )
+        if moved:
+            invalidate_dashboard_stats()
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив заказов: {moved}'))
@@ -0,0 +1,46 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Заполняет Order.item_count и Order.items_summary для заказов, созданных до их появления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help='Пересчитать все заказы, а не только незаполненные')
+
+    def handle(self, *args, **options):
+        queryset = Order.objects.all() if options['all'] else Order.objects.filter(item_count=0)
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+
+        # Проход по первичному ключу: заказы без позиций остаются с item_count=0,
+        # но повторно не выбираются
+        while True:
+            orders = list(queryset.filter(pk__gt=last_id).order_by('pk').only('id')[:batch_size])
+            if not orders:
+                break
+            last_id = orders[-1].pk
+
+            lines = defaultdict(list)
+            items = (
+                OrderItem.objects.filter(order_id__in=[order.pk for order in orders])
+                .order_by('order_id', 'id')
+                .values_list('order_id', 'dish__name', 'quantity')
+            )
+            for order_id, dish_name, quantity in items:
+                lines[order_id].append((dish_name, quantity))
+
+            for order in orders:
+                order.set_items_summary(lines[order.pk])
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ['item_count', 'items_summary'])
+            updated += len(orders)
+            self.stdout.write(f'  заказов: {updated}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано заказов: {updated}'))
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from myproject import images
+from users.models import CustomUser
+from orders.models import Dish
+from orders.menu_cache import bump_menu_version
+
+# (модель, поле файла, поле описания вариантов, параметры миниатюр)
+TARGETS = [
+    (Dish, 'image', 'image_variants', images.DISH_IMAGE),
+    (CustomUser, 'avatar', 'avatar_variants', images.AVATAR),
+]
+
+
+class Command(BaseCommand):
+    help = 'Строит WebP/JPEG миниатюры для уже загруженных фото блюд и аватаров в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--all', action='store_true', help='Пересобрать описание и для записей, где оно уже есть')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, file_field, variants_field, spec in TARGETS:
+            rows = model.objects.exclude(**{file_field: ''}).exclude(**{f'{file_field}__isnull': True})
+            for pk, name, variants in rows.values_list('pk', file_field, variants_field):
+                if options['all'] or (variants or {}).get('source') != name:
+                    jobs.append((model, variants_field, pk, name, spec))
+
+        if not jobs:
+            self.stdout.write('Все изображения уже обработаны')
+            return
+
+        done = failed = 0
+        # Пул без доступа к базе: процессы только читают оригинал и пишут файлы,
+        # результат сохраняет основной процесс
+        with ProcessPoolExecutor(max_workers=max(options['processes'], 1), initializer=django.setup) as pool:
+            futures = {pool.submit(images.build_variants, job[3], job[4]): job for job in jobs}
+            for future in as_completed(futures):
+                model, variants_field, pk, name, spec = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{name}: {e}')
+                    # Сохранение записи не будет пытаться снова; повторить - с --all
+                    model.objects.filter(pk=pk).update(**{variants_field: images.failed_variants(name)})
+                    continue
+                model.objects.filter(pk=pk).update(**{variants_field: variants})
+                done += 1
+
+        # update() не шлет сигналы - снимки меню сбрасываем сами
+        bump_menu_version()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {done}, с ошибкой: {failed}'))
@@ -0,0 +1,39 @@
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders import slots
+
+
+def _time(value):
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Время в формате ЧЧ:ММ: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Создает слоты выдачи предзаказов на ближайшие дни (уже созданные не меняются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='На сколько дней вперед, начиная с сегодня')
+        parser.add_argument('--from', dest='first', default='08:00', help='Начало первого слота')
+        parser.add_argument('--to', dest='last', default='16:00', help='Конец последнего слота')
+        parser.add_argument('--minutes', type=int, default=15, help='Длина слота в минутах')
+        parser.add_argument('--capacity', type=int, default=40, help='Порций, которые кухня успевает к слоту')
+        parser.add_argument('--weekends', action='store_true', help='Создавать слоты и на субботу с воскресеньем')
+
+    def handle(self, *args, **options):
+        first, last = _time(options['first']), _time(options['last'])
+        if first >= last or options['minutes'] < 1 or options['capacity'] < 1:
+            raise CommandError('Нужны --from < --to, положительные --minutes и --capacity')
+
+        today = timezone.localdate()
+        created = 0
+        for offset in range(max(options['days'], 1)):
+            day = today + timedelta(days=offset)
+            if day.weekday() >= 5 and not options['weekends']:
+                continue
+            created += slots.create_slots(day, first, last, options['minutes'], options['capacity'])
+        self.stdout.write(self.style.SUCCESS(f'Слотов в расписании: {created}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from orders import menu_io
+
+
+class Command(BaseCommand):
+    help = 'Выгружает меню в CSV или JSON Lines потоком - формат совместим с import_menu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=menu_io.FORMATS, default='csv')
+        parser.add_argument('--output', '-o', default='-', help='Файл; по умолчанию стандартный вывод')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            menu_io.write_rows(menu_io.export_rows(), self.stdout, options['format'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                menu_io.write_rows(menu_io.export_rows(), f, options['format'])
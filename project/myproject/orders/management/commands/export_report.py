@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myproject import xlsx
+from orders import reports
+
+
+class Command(BaseCommand):
+    help = 'Выгружает отчет по заказам за период в CSV или XLSX потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', choices=list(reports.REPORTS), default='orders')
+        parser.add_argument('--from', dest='date_from', help='ГГГГ-ММ-ДД, включительно')
+        parser.add_argument('--to', dest='date_to', help='ГГГГ-ММ-ДД, включительно; по умолчанию сегодня')
+        parser.add_argument('--format', choices=reports.FORMATS, help='По умолчанию - по расширению --output, иначе csv')
+        parser.add_argument('--output', '-o', default='-', help='Файл; CSV можно в стандартный вывод')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('xlsx' if output.endswith('.xlsx') else 'csv')
+        try:
+            date_from, date_to = reports.parse_period(options['date_from'], options['date_to'])
+        except ValueError as e:
+            raise CommandError(e)
+        header, rows = reports.report_rows(options['report'], date_from, date_to)
+
+        if fmt == 'xlsx':
+            if output == '-':
+                raise CommandError('XLSX пишется только в файл: укажите --output')
+            with open(output, 'wb') as f:
+                for chunk in xlsx.stream_xlsx(header, rows, reports.REPORTS[options['report']][0]):
+                    f.write(chunk)
+        elif output == '-':
+            for line in reports.stream_csv(header, rows):
+                self.stdout.write(line, ending='')
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(reports.stream_csv(header, rows))
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+try:
+    from orders import forecast
+except ImportError:  # Прогнозу нужен пакет numpy (pip install numpy), остальному проекту - нет
+    forecast = None
+
+# Совпадает с forecast.HISTORY_WEEKS; здесь - чтобы --help работал и без numpy
+HISTORY_WEEKS = 52
+
+
+class Command(BaseCommand):
+    help = 'Считает прогноз спроса на блюда (по умолчанию на завтра); запускать по ночам. Нужен пакет numpy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Первый день прогноза, ГГГГ-ММ-ДД (по умолчанию завтра)')
+        parser.add_argument('--days', type=int, default=1, help='На сколько дней вперед, до 7')
+        parser.add_argument('--weeks', type=int, default=HISTORY_WEEKS, help='Сколько недель истории учитывать')
+
+    def handle(self, *args, **options):
+        if forecast is None:
+            raise CommandError('Для прогноза нужен пакет numpy: pip install numpy')
+        if options['date']:
+            try:
+                first_day = parse_date(options['date'])
+            except ValueError:
+                first_day = None
+            if first_day is None:
+                raise CommandError(f'Дата в формате ГГГГ-ММ-ДД: {options["date"]}')
+        else:
+            first_day = timezone.localdate() + timedelta(days=1)
+        if not 1 <= options['days'] <= 7:
+            raise CommandError('--days: от 1 до 7')
+
+        started = time.perf_counter()
+        rows = forecast.save_forecast(first_day, options['days'], weeks=max(options['weeks'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогноз с {first_day}: строк {rows}, {time.perf_counter() - started:.2f} с'
+        ))
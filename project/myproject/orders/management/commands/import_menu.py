@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import menu_io
+
+
+class Command(BaseCommand):
+    help = ('Загружает меню из CSV или JSON Lines (category, name, description, price, is_available): '
+            'новые категории и блюда создаются, существующие обновляются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл меню; "-" - стандартный ввод')
+        parser.add_argument('--format', choices=menu_io.FORMATS, help='По умолчанию - по расширению файла')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать изменения, ничего не записывать')
+        parser.add_argument('--batch-size', type=int, default=menu_io.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or menu_io.guess_format(path)
+        # diff печатается сразу, при --dry-run или -v 2
+        show_diff = options['dry_run'] or options['verbosity'] > 1
+        importer = menu_io.MenuImport(
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            on_diff=self.stdout.write if show_diff else None,
+        )
+
+        try:
+            if path == '-':
+                importer.run(menu_io.read_rows(sys.stdin, fmt))
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as f:
+                    importer.run(menu_io.read_rows(f, fmt))
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        style = self.style.WARNING if importer.error_count else self.style.SUCCESS
+        self.stdout.write(style(importer.summary()))
@@ -0,0 +1,132 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from users.models import CustomUser
+from orders.models import Dish
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга"""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class Recorder:
+    """Время и число SQL-запросов по имени URL"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def request(self, client, method, path, **data):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {path} вернул {response.status_code}')
+        with self.lock:
+            self.samples[resolve(path).url_name].append((elapsed, len(queries)))
+        return response
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон на тестовом клиенте: меню -> корзина -> заказ -> повар отмечает готовность. '
+            'Пишет в текущую базу - запускайте на базе, заполненной seed_canteen')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=200, help='Сколько раз пройти сценарий')
+        parser.add_argument('--concurrency', type=int, default=4, help='Параллельных потоков')
+        parser.add_argument('--max-items', type=int, default=3)
+        parser.add_argument('--prefix', default='seed', help='Префикс пользователей из seed_canteen')
+        parser.add_argument('--host', default='localhost', help='Значение заголовка Host')
+        parser.add_argument('--random-seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        students = list(CustomUser.objects.filter(role='student', username__startswith=options['prefix']))
+        chefs = list(CustomUser.objects.filter(role='chef', username__startswith=options['prefix']))
+        dish_ids = list(Dish.objects.filter(is_available=True).values_list('id', flat=True))
+        if not students or not chefs or not dish_ids:
+            raise CommandError('Нет учеников, поваров или блюд - сначала запустите seed_canteen')
+
+        self.options = options
+        self.recorder = Recorder()
+        rng = random.Random(options['random_seed'])
+        flows = [
+            (rng.choice(students), rng.choice(chefs), rng.sample(dish_ids, rng.randint(1, min(options['max_items'], len(dish_ids)))))
+            for _ in range(options['flows'])
+        ]
+
+        start = time.perf_counter()
+        if options['concurrency'] <= 1:
+            self.run_flows(flows)
+        else:
+            threads = [
+                threading.Thread(target=self.run_flows, args=(flows[i::options['concurrency']],))
+                for i in range(options['concurrency'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.report(elapsed)
+
+    def run_flows(self, flows):
+        try:
+            for student, chef, dishes in flows:
+                try:
+                    self.run_flow(student, chef, dishes)
+                except Exception as e:
+                    with self.recorder.lock:
+                        self.recorder.errors.append(str(e))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    def run_flow(self, student, chef, dishes):
+        record = self.recorder.request
+        client = Client(HTTP_HOST=self.options['host'])
+        client.force_login(student)
+        record(client, 'get', reverse('menu'))
+        for dish_id in dishes:
+            record(client, 'post', reverse('add_to_cart', args=[dish_id]))
+        record(client, 'get', reverse('view_cart'))
+        response = record(client, 'post', reverse('create_order'))
+        order_id = resolve(response.url).kwargs.get('order_id')
+        if order_id is None:
+            raise CommandError(f'Заказ не создан, редирект на {response.url}')
+        record(client, 'get', reverse('order_detail', args=[order_id]))
+
+        kitchen = Client(HTTP_HOST=self.options['host'])
+        kitchen.force_login(chef)
+        record(kitchen, 'get', reverse('chef_orders'))
+        record(kitchen, 'post', reverse('update_order_status', args=[order_id]), status='ready')
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.recorder.samples.values())
+        self.stdout.write(f'{self.options["flows"]} сценариев, {total} запросов за {elapsed:.2f} с '
+                          f'({total / elapsed:.1f} запр/с)')
+        self.stdout.write(f'{"URL":<22}{"n":>6}{"p50 мс":>10}{"p95 мс":>10}{"p99 мс":>10}{"SQL/запр":>10}')
+        for name, samples in sorted(self.recorder.samples.items()):
+            timings = [elapsed * 1000 for elapsed, _ in samples]
+            queries = sum(count for _, count in samples) / len(samples)
+            self.stdout.write(
+                f'{name:<22}{len(samples):>6}{percentile(timings, 50):>10.1f}'
+                f'{percentile(timings, 95):>10.1f}{percentile(timings, 99):>10.1f}{queries:>10.1f}'
+            )
+        if self.recorder.errors:
+            self.stdout.write(self.style.ERROR(
+                f'Сценариев с ошибкой: {len(self.recorder.errors)}, первая: {self.recorder.errors[0]}'
+            ))
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders import sales
+from orders.dashboard import invalidate_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку продаж DailySales из заказов за период (по умолчанию - за всю историю)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Первый день, ГГГГ-ММ-ДД')
+        parser.add_argument('--to', dest='date_to', help='Последний день, ГГГГ-ММ-ДД (по умолчанию сегодня)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Сколько дней пересчитывать одной транзакцией')
+
+    def handle(self, *args, **options):
+        date_to = self.parse(options['date_to']) or timezone.localdate()
+        date_from = self.parse(options['date_from'])
+        if date_from is None:
+            firsts = [
+                order_model.objects.aggregate(first=Min('created_at'))['first']
+                for order_model, _ in sales.SOURCES
+            ]
+            firsts = [first for first in firsts if first is not None]
+            if not firsts:
+                self.stdout.write('Заказов нет')
+                return
+            date_from = timezone.localdate(min(firsts))
+        if date_from > date_to:
+            raise CommandError('Начало периода позже конца')
+
+        step = timedelta(days=max(options['chunk_days'], 1))
+        rows = 0
+        start = date_from
+        while start <= date_to:
+            end = min(start + step - timedelta(days=1), date_to)
+            rows += sales.rebuild(start, end)
+            self.stdout.write(f'  {start} - {end}: строк {rows}')
+            start = end + timedelta(days=1)
+
+        # Сводка записана bulk_create - кэш панели сбрасываем сами
+        invalidate_dashboard_stats()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {date_from} - {date_to}, строк сводки {rows}'))
+
+    def parse(self, value):
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f'Дата в формате ГГГГ-ММ-ДД: {value}')
+        return day
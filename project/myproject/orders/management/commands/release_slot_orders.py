@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from orders import slots
+
+
+class Command(BaseCommand):
+    # Обязательна для предзаказов: страница повара сама заказы не передает
+    help = 'Передает на кухню предзаказы, чьи слоты скоро начнутся; запускать по cron раз в минуту'
+
+    def handle(self, *args, **options):
+        released = slots.release_due_orders()
+        self.stdout.write(f'Передано на кухню: {len(released)}')
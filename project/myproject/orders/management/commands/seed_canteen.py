@@ -0,0 +1,148 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import CustomUser
+from orders.models import Category, Dish, Order, OrderItem
+from orders import sales
+from orders.menu_cache import bump_menu_version
+from orders.dashboard import invalidate_dashboard_stats
+
+CATEGORY_NAMES = ['Супы', 'Горячее', 'Гарниры', 'Салаты', 'Выпечка', 'Напитки', 'Десерты', 'Завтраки']
+DISH_NAMES = ['Борщ', 'Щи', 'Котлета', 'Плов', 'Пюре', 'Гречка', 'Винегрет', 'Пирожок',
+              'Компот', 'Чай', 'Сырники', 'Каша', 'Омлет', 'Запеканка', 'Кисель', 'Булочка']
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими учениками, поварами, меню и заказами (bulk_create)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--chefs', type=int, default=5)
+        parser.add_argument('--categories', type=int, default=6)
+        parser.add_argument('--dishes', type=int, default=60)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--max-items', type=int, default=4, help='Максимум позиций в заказе')
+        parser.add_argument('--days', type=int, default=30, help='За сколько дней распределить заказы')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='seed', help='Префикс логинов создаваемых пользователей')
+        parser.add_argument('--random-seed', type=int, default=None)
+        parser.add_argument('--password', default='seed-password',
+                            help='Пароль всех созданных пользователей')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['random_seed'])
+        self.batch_size = options['batch_size']
+
+        students = self.create_users(options['prefix'], 'student', options['students'], options['password'])
+        chefs = self.create_users(options['prefix'], 'chef', options['chefs'], options['password'])
+        dishes = self.create_menu(options['categories'], options['dishes'], chefs)
+        created = self.create_orders(students, dishes, options['orders'], options['max_items'], options['days'])
+        if created:
+            # Заказы вставлены bulk_create мимо place_order - сводку продаж за эти дни пересчитываем
+            today = timezone.localdate()
+            sales.rebuild(today - timedelta(days=max(options['days'], 1)), today)
+        # bulk_create не посылает сигналы - кэши сбрасываем сами
+        bump_menu_version()
+        invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: учеников {len(students)}, поваров {len(chefs)}, '
+            f'блюд {len(dishes)}, заказов {created}'
+        ))
+
+    def create_users(self, prefix, role, count, password):
+        if not count:
+            return []
+        # Хэш пароля считается один раз - он дорогой
+        password_hash = make_password(password)
+        usernames = [f'{prefix}_{role}_{i}' for i in range(count)]
+        CustomUser.objects.bulk_create(
+            [CustomUser(username=name, password=password_hash, role=role) for name in usernames],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        return list(CustomUser.objects.filter(username__in=usernames, role=role).values_list('id', flat=True))
+
+    def create_menu(self, category_count, dish_count, chefs):
+        names = [
+            CATEGORY_NAMES[i % len(CATEGORY_NAMES)] + (f' {i}' if i >= len(CATEGORY_NAMES) else '')
+            for i in range(category_count)
+        ]
+        # Названия уникальны - при повторном запуске берем уже созданные категории
+        Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+        categories = list(Category.objects.filter(name__in=names))
+        dishes = Dish.objects.bulk_create(
+            [
+                Dish(
+                    name=f'{self.rng.choice(DISH_NAMES)} №{i}',
+                    description='Синтетическое блюдо',
+                    price=Decimal(self.rng.randrange(3000, 25000)) / 100,
+                    category=self.rng.choice(categories),
+                    created_by_id=self.rng.choice(chefs) if chefs else None,
+                )
+                for i in range(dish_count)
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['category', 'name'],
+            update_fields=['description', 'price'],
+        )
+        return dishes
+
+    def create_orders(self, students, dishes, count, max_items, days):
+        if not students or not dishes:
+            return 0
+        now = timezone.now()
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            with transaction.atomic():
+                self.create_order_batch(students, dishes, size, max_items, days, now)
+            created += size
+            self.stdout.write(f'  заказов: {created}/{count}')
+        return created
+
+    def create_order_batch(self, students, dishes, size, max_items, days, now):
+        orders = []
+        dates = []
+        lines = []
+        for _ in range(size):
+            created_at = now - timedelta(seconds=self.rng.randrange(max(days, 1) * 24 * 3600))
+            order_lines = [
+                (dish, self.rng.randint(1, 3))
+                for dish in self.rng.sample(dishes, self.rng.randint(1, min(max_items, len(dishes))))
+            ]
+            if now - created_at < timedelta(hours=1):
+                status = 'preparing'
+            else:
+                status = 'cancelled' if self.rng.random() < 0.05 else 'ready'
+            order = Order(
+                customer_id=self.rng.choice(students),
+                status=status,
+                total_price=sum(dish.price * quantity for dish, quantity in order_lines),
+            )
+            order.set_items_summary([(dish.name, quantity) for dish, quantity in order_lines])
+            orders.append(order)
+            dates.append((created_at, created_at + timedelta(minutes=self.rng.randint(3, 20))))
+            lines.append(order_lines)
+
+        Order.objects.bulk_create(orders, batch_size=self.batch_size)
+        # auto_now_add/auto_now перезаписывают даты при вставке - возвращаем их
+        for order, (created_at, updated_at) in zip(orders, dates):
+            order.created_at, order.updated_at = created_at, updated_at
+        Order.objects.bulk_update(orders, ['created_at', 'updated_at'], batch_size=self.batch_size)
+
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, dish=dish, quantity=quantity, price_at_time=dish.price)
+                for order, order_lines in zip(orders, lines)
+                for dish, quantity in order_lines
+            ],
+            batch_size=self.batch_size,
+        )
@@ -0,0 +1,95 @@
+"""Кэш меню с версионным ключом.
+
+Снимок меню хранится в общем кэше Django под ключом с номером версии
+и дополнительно в памяти процесса. Любое изменение Dish или Category
+увеличивает версию (см. signals.py), поэтому старые снимки просто
+перестают читаться.
+
+Версия видна другим процессам, только если кэш общий (REDIS_URL в
+settings.py). Кэш в памяти процесса у каждого worker'а свой, поэтому с
+ним снимок живет не дольше MENU_LOCAL_TTL секунд: чужие изменения
+появятся с такой задержкой.
+"""
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import Category, Dish
+
+MENU_VERSION_KEY = 'menu:version'
+MENU_CACHE_TIMEOUT = 60 * 60
+# Сколько живут снимки в памяти процесса
+MENU_LOCAL_TTL = 30
+
+# Снимки текущей версии, уже загруженные этим процессом
+_local = {'version': None, 'loaded_at': 0, 'menus': {}}
+
+
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Ключ мог быть вытеснен - начинаем с уникального значения,
+        # чтобы не совпасть со старыми снимками
+        cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Сбрасывает кэш меню, увеличивая версию"""
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.set(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _build_menu():
+    dishes = list(Dish.objects.filter(is_available=True).select_related('category'))
+    categories = list(Category.objects.all())
+    return {'dishes': dishes, 'categories': categories}
+
+
+def _load_full_menu(version):
+    key = f'menu:{version}:all'
+    menu = cache.get(key)
+    if menu is None:
+        menu = _build_menu()
+        # Кэш процесса не узнает о смене версии в других worker'ах
+        shared = not isinstance(caches['default'], LocMemCache)
+        cache.set(key, menu, MENU_CACHE_TIMEOUT if shared else MENU_LOCAL_TTL)
+    return menu
+
+
+def get_menu(category_id=None):
+    """Снимок меню: {'dishes': [...], 'categories': [...]}.
+
+    Для category_id возвращается отфильтрованный вид, который строится
+    из полного снимка без обращения к базе. Запоминаются виды только
+    существующих категорий.
+    """
+    version = get_menu_version()
+    now = time.monotonic()
+    if _local['version'] != version or now - _local['loaded_at'] > MENU_LOCAL_TTL:
+        _local.update(version=version, loaded_at=now, menus={})
+    menus = _local['menus']
+
+    key = category_id or 'all'
+    menu = menus.get(key)
+    if menu is not None:
+        return menu
+
+    full_menu = menus.get('all')
+    if full_menu is None:
+        full_menu = menus['all'] = _load_full_menu(version)
+    if category_id:
+        menu = {
+            'dishes': [dish for dish in full_menu['dishes'] if dish.category_id == category_id],
+            'categories': full_menu['categories'],
+        }
+        # id категории приходит из запроса - несуществующие не копятся в памяти
+        if any(category.id == category_id for category in full_menu['categories']):
+            menus[key] = menu
+    else:
+        menu = full_menu
+    return menu
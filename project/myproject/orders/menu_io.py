@@ -0,0 +1,218 @@
+"""Импорт и экспорт меню в CSV и JSON Lines.
+
+Общий движок для команд import_menu/export_menu и формы загрузки на
+странице управления блюдами. Файл читается построчно и обрабатывается
+пачками: на пачку - чтение существующих категорий и блюд и один upsert
+bulk_create(update_conflicts=True) по ключу (категория, название).
+Память не зависит от размера файла.
+
+Колонки: category, name, description, price, is_available. Для
+существующего блюда можно передать только часть колонок - остальные
+не меняются; для нового обязательна цена.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Category, Dish
+from .menu_cache import bump_menu_version
+from .dashboard import invalidate_dashboard_stats
+
+FIELDS = ['category', 'name', 'description', 'price', 'is_available']
+# Поля блюда, которые обновляет импорт
+UPDATE_FIELDS = ['description', 'price', 'is_available']
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 500
+# Сколько ошибок хранить с текстом; дальше только считаются
+MAX_ERRORS = 100
+
+_TRUE = {'1', 'true', 'yes', 'да', '+'}
+_FALSE = {'0', 'false', 'no', 'нет', '-'}
+
+
+def guess_format(filename, default='csv'):
+    name = filename.lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """(номер строки, словарь) из текстового потока; битая строка JSON - (номер, None)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Неизвестный формат: {fmt}')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f'is_available: ожидается да/нет, получено {value!r}')
+
+
+def parse_row(row):
+    """((категория, название), {поле: значение}) только для заполненных колонок"""
+    if row is None:
+        raise ValueError('некорректная строка JSON')
+    category = str(row.get('category') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not category or not name:
+        raise ValueError('пустые category или name')
+    if len(category) > Category._meta.get_field('name').max_length or len(name) > Dish._meta.get_field('name').max_length:
+        raise ValueError('слишком длинное название')
+
+    values = {}
+    if row.get('description') is not None:
+        values['description'] = str(row['description'])
+    if row.get('price') not in (None, ''):
+        try:
+            price = Decimal(str(row['price']).replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f'price: не число {row["price"]!r}')
+        if not price.is_finite() or not 0 <= price < 10 ** 8:
+            raise ValueError(f'price: недопустимая цена {row["price"]!r}')
+        values['price'] = price.quantize(Decimal('0.01'))
+    if row.get('is_available') not in (None, ''):
+        values['is_available'] = _parse_bool(row['is_available'])
+    return (category, name), values
+
+
+class MenuImport:
+    """Импорт пачками; diff по строкам отдается в on_diff, а не копится в памяти"""
+
+    def __init__(self, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, on_diff=None):
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.on_diff = on_diff or (lambda line: None)
+        self.created = self.updated = self.unchanged = self.new_categories = 0
+        self.error_count = 0
+        self.errors = []
+        # Категории, которые при dry_run были бы созданы в прошлых пачках
+        self.planned_categories = set()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.process_batch(batch)
+        if not self.dry_run and (self.created or self.updated or self.new_categories):
+            # bulk_create не посылает сигналы - кэши сбрасываем сами
+            bump_menu_version()
+            invalidate_dashboard_stats()
+        return self
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'строка {line_no}: {message}')
+
+    def process_batch(self, batch):
+        parsed = {}
+        for line_no, row in batch:
+            try:
+                key, values = parse_row(row)
+            except ValueError as e:
+                self.add_error(line_no, e)
+                continue
+            # Повтор ключа в файле: побеждает последняя строка
+            parsed.pop(key, None)
+            parsed[key] = (line_no, values)
+        if not parsed:
+            return
+
+        category_names = {category for category, _ in parsed}
+        with transaction.atomic():
+            categories = {c.name: c for c in Category.objects.filter(name__in=category_names)}
+            missing = sorted(category_names - categories.keys() - self.planned_categories)
+            for name in missing:
+                self.on_diff(f'+ категория {name}')
+            self.new_categories += len(missing)
+            if self.dry_run:
+                self.planned_categories.update(missing)
+            elif missing:
+                Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+                categories.update({c.name: c for c in Category.objects.filter(name__in=missing)})
+
+            existing = {
+                (dish.category.name, dish.name): dish
+                for dish in Dish.objects.select_related('category').filter(
+                    category__name__in=category_names, name__in={name for _, name in parsed},
+                )
+            }
+            to_save = []
+            for (category, name), (line_no, values) in parsed.items():
+                dish = existing.get((category, name))
+                if dish is None:
+                    if 'price' not in values:
+                        self.add_error(line_no, f'{category} / {name}: для нового блюда нужна цена')
+                        continue
+                    values = {'description': '', 'is_available': True, **values}
+                    self.created += 1
+                    self.on_diff(f'+ {category} / {name}: ' + ', '.join(f'{f}={v}' for f, v in values.items()))
+                else:
+                    changes = [(f, getattr(dish, f), v) for f, v in values.items() if getattr(dish, f) != v]
+                    if not changes:
+                        self.unchanged += 1
+                        continue
+                    values = {f: getattr(dish, f) for f in UPDATE_FIELDS} | values
+                    self.updated += 1
+                    self.on_diff(f'~ {category} / {name}: ' + ', '.join(f'{f} {old} -> {new}' for f, old, new in changes))
+                if not self.dry_run:
+                    to_save.append(Dish(category=categories[category], name=name, **values))
+
+            if to_save:
+                Dish.objects.bulk_create(
+                    to_save,
+                    update_conflicts=True,
+                    unique_fields=['category', 'name'],
+                    update_fields=UPDATE_FIELDS,
+                )
+
+    def summary(self):
+        prefix = 'Проверка (без записи): ' if self.dry_run else ''
+        return (f'{prefix}новых блюд {self.created}, изменено {self.updated}, без изменений {self.unchanged}, '
+                f'новых категорий {self.new_categories}, ошибок {self.error_count}')
+
+
+def export_rows(chunk_size=2000):
+    """Все блюда потоком, по категориям и названиям"""
+    dishes = (
+        Dish.objects.order_by('category__name', 'name')
+        .values_list('category__name', 'name', 'description', 'price', 'is_available')
+    )
+    for values in dishes.iterator(chunk_size=chunk_size):
+        yield dict(zip(FIELDS, values))
+
+
+def write_rows(rows, out, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, 'is_available': int(row['is_available'])})
+    elif fmt == 'jsonl':
+        for row in rows:
+            out.write(json.dumps({**row, 'price': str(row['price'])}, ensure_ascii=False) + '\n')
+    else:
+        raise ValueError(f'Неизвестный формат: {fmt}')
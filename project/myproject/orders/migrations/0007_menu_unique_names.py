@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    """Повторяющиеся названия получают суффикс с id - ничего не удаляется"""
+    Category = apps.get_model('orders', 'Category')
+    Dish = apps.get_model('orders', 'Dish')
+
+    names = Category.objects.values('name').annotate(n=Count('id')).filter(n__gt=1).values_list('name', flat=True)
+    for category in Category.objects.filter(name__in=list(names)).order_by('id')[1:]:
+        if Category.objects.filter(name=category.name, id__lt=category.id).exists():
+            category.name = f'{category.name[:90]} ({category.id})'
+            category.save(update_fields=['name'])
+
+    pairs = Dish.objects.values('category_id', 'name').annotate(n=Count('id')).filter(n__gt=1)
+    for pair in pairs:
+        for dish in Dish.objects.filter(category_id=pair['category_id'], name=pair['name']).order_by('id')[1:]:
+            dish.name = f'{dish.name[:185]} ({dish.id})'
+            dish.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100, unique=True, verbose_name='Название'),
+        ),
+        migrations.AddConstraint(
+            model_name='dish',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='dish_category_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    """Сводка по уже оформленным заказам - то же, что sales.rebuild за всю историю"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('orders', 'DailySales')
+
+    rows = {}
+
+    def row(day, dish_id):
+        return rows.setdefault((day, dish_id), DailySales(date=day, dish_id=dish_id))
+
+    totals = (
+        Order.objects.annotate(day=TruncDate('created_at')).values('day')
+        .annotate(order_count=Count('id'), cancelled_count=Count('id', filter=Q(status='cancelled')),
+                  total=Sum('total_price', filter=~Q(status='cancelled')))
+        .order_by()
+    )
+    for total in totals:
+        day_row = row(total['day'], None)
+        day_row.orders, day_row.cancelled = total['order_count'], total['cancelled_count']
+        day_row.revenue = total['total'] or 0
+
+    not_cancelled = ~Q(order__status='cancelled')
+    line_total = ExpressionWrapper(F('quantity') * F('price_at_time'),
+                                   output_field=DecimalField(max_digits=12, decimal_places=2))
+    dishes = (
+        OrderItem.objects.annotate(day=TruncDate('order__created_at')).values('day', 'dish_id')
+        .annotate(order_count=Count('order_id', distinct=True),
+                  cancelled_count=Count('order_id', distinct=True, filter=Q(order__status='cancelled')),
+                  portions=Sum('quantity', filter=not_cancelled), total=Sum(line_total, filter=not_cancelled))
+        .order_by()
+    )
+    for dish in dishes:
+        portions = dish['portions'] or 0
+        row(dish['day'], None).quantity += portions
+        dish_row = row(dish['day'], dish['dish_id'])
+        dish_row.orders, dish_row.cancelled = dish['order_count'], dish['cancelled_count']
+        dish_row.quantity, dish_row.revenue = portions, dish['total'] or 0
+
+    DailySales.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_menu_unique_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('cancelled', models.IntegerField(default=0, verbose_name='Отменено')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Порций')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('dish', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='orders.dish', verbose_name='Блюдо')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'dish'), name='daily_sales_dish_uniq'), models.UniqueConstraint(condition=models.Q(('dish__isnull', True)), fields=('date',), name='daily_sales_total_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('expected', models.FloatField(verbose_name='Ожидается порций')),
+                ('recommended', models.PositiveIntegerField(verbose_name='Заготовить порций')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Рассчитано')),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='orders.dish', verbose_name='Блюдо')),
+            ],
+            options={
+                'verbose_name': 'Прогноз спроса',
+                'verbose_name_plural': 'Прогнозы спроса',
+                'ordering': ['date', 'dish'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'dish'), name='forecast_date_dish_uniq')],
+            },
+        ),
+    ]
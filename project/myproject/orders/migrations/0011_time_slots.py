@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_demand_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField(unique=True, verbose_name='Начало')),
+                ('ends_at', models.DateTimeField(verbose_name='Конец')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Порций на слот')),
+                ('reserved', models.PositiveIntegerField(default=0, editable=False, verbose_name='Занято порций')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Открыт для записи')),
+            ],
+            options={
+                'verbose_name': 'Слот выдачи',
+                'verbose_name_plural': 'Слоты выдачи',
+                'ordering': ['starts_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='orders.timeslot', verbose_name='Слот выдачи'),
+        ),
+    ]
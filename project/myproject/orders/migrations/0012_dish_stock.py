@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_time_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - остаток не учитывается', null=True, verbose_name='Остаток порций'),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.text import Truncator
 from users.models import CustomUser
 
+# Смена статуса через Order.transition/bulk_transition (UPDATE не шлет post_save).
+# Шлется внутри транзакции перехода. Аргументы: order_ids, from_status, to_status
+order_status_changed = Signal()
+
 class Category(models.Model):
-    name = models.CharField(max_length=100, verbose_name='Название')
+    name = models.CharField(max_length=100, unique=True, verbose_name='Название')
     description = models.TextField(blank=True, verbose_name='Описание')
     
     class Meta:
@@ -19,7 +26,12 @@ class Dish(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name='Категория')
     image = models.ImageField(upload_to='dishes/', blank=True, null=True, verbose_name='Изображение')
+    # Миниатюры WebP/JPEG (myproject/images.py), строятся при сохранении
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_available = models.BooleanField(default=True, verbose_name='Доступно')
+    # Остаток списывает place_order; на нуле блюдо снимается с продажи (services.py)
+    stock = models.PositiveIntegerField(null=True, blank=True, verbose_name='Остаток порций',
+                                        help_text='Пусто - остаток не учитывается')
     created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     
@@ -27,10 +39,43 @@ class Dish(models.Model):
         verbose_name = 'Блюдо'
         verbose_name_plural = 'Блюда'
         ordering = ['category', 'name']
+        constraints = [
+            # Ключ upsert при импорте меню (orders/menu_io.py)
+            models.UniqueConstraint(fields=['category', 'name'], name='dish_category_name_uniq'),
+        ]
+        indexes = [
+            # Меню: только доступные блюда, по категориям и названию
+            models.Index(
+                fields=['category', 'name'],
+                name='dish_available_idx',
+                condition=models.Q(is_available=True),
+            ),
+        ]
     
     def __str__(self):
         return self.name
 
+class TimeSlot(models.Model):
+    """Окно выдачи предзаказов с лимитом порций для кухни (orders/slots.py)"""
+    starts_at = models.DateTimeField(unique=True, verbose_name='Начало')
+    ends_at = models.DateTimeField(verbose_name='Конец')
+    capacity = models.PositiveIntegerField(verbose_name='Порций на слот')
+    # Счетчик меняется только условным UPDATE (slots.reserve/release)
+    reserved = models.PositiveIntegerField(default=0, editable=False, verbose_name='Занято порций')
+    is_active = models.BooleanField(default=True, verbose_name='Открыт для записи')
+    
+    class Meta:
+        verbose_name = 'Слот выдачи'
+        verbose_name_plural = 'Слоты выдачи'
+        ordering = ['starts_at']
+    
+    def __str__(self):
+        return f"{timezone.localtime(self.starts_at):%d.%m %H:%M}–{timezone.localtime(self.ends_at):%H:%M}"
+    
+    @property
+    def remaining(self):
+        return max(self.capacity - self.reserved, 0)
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'В ожидании'),
@@ -39,6 +84,16 @@ class Order(models.Model):
         ('ready', 'Готово'),
         ('cancelled', 'Отменено'),
     ]
+    # Заказы, которые еще в работе
+    ACTIVE_STATUSES = ['pending', 'confirmed', 'preparing']
+    # Допустимые переходы: текущий статус -> куда можно перейти
+    TRANSITIONS = {
+        'pending': ['confirmed', 'preparing', 'cancelled'],
+        'confirmed': ['preparing', 'cancelled'],
+        'preparing': ['ready', 'cancelled'],
+        'ready': [],
+        'cancelled': [],
+    }
     
     customer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, 
                                  related_name='orders', verbose_name='Ученик')
@@ -49,14 +104,91 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     notes = models.TextField(blank=True, verbose_name='Примечания')
+    # Денормализация позиций для списков заказов: пишется при создании
+    # (services.place_order), старые заказы - командой backfill_order_summaries
+    item_count = models.PositiveIntegerField(default=0, verbose_name='Порций')
+    items_summary = models.CharField(max_length=255, blank=True, verbose_name='Состав')
+    # Предзаказ на перемену; без слота заказ готовится сразу
+    slot = models.ForeignKey(TimeSlot, on_delete=models.PROTECT, null=True, blank=True,
+                             related_name='orders', verbose_name='Слот выдачи')
     
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
+        indexes = [
+            # Очередь кухни и выборки по статусу
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # История заказов ученика
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+            # Постраничная история всех заказов (orders/pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # Частичный индекс только по активным заказам. Создается там, где
+            # backend поддерживает частичные индексы; SQLite применяет его
+            # не ко всем запросам, поэтому индекс по статусу выше тоже нужен
+            models.Index(
+                fields=['created_at'],
+                name='order_active_created_idx',
+                condition=models.Q(status__in=['pending', 'confirmed', 'preparing']),
+            ),
+        ]
     
     def __str__(self):
         return f"Заказ #{self.id} от {self.customer.username}"
+    
+    def set_items_summary(self, lines):
+        """Заполняет item_count и items_summary из пар (название блюда, количество)"""
+        self.item_count = sum(quantity for _, quantity in lines)
+        summary = ', '.join(f'{name} ×{quantity}' for name, quantity in lines)
+        self.items_summary = Truncator(summary).chars(self._meta.get_field('items_summary').max_length)
+    
+    def can_transition(self, new_status):
+        return new_status in self.TRANSITIONS.get(self.status, [])
+    
+    def transition(self, new_status, expected=None):
+        """Меняет статус одним условным UPDATE ... WHERE status = expected.
+        
+        Пишутся только status и updated_at. Возвращает False, если статус
+        в базе уже не expected (заказ успел изменить кто-то другой).
+        Последствия перехода (order_status_changed) пишутся в той же
+        транзакции: ошибка в них откатывает и смену статуса.
+        """
+        expected = expected or self.status
+        if new_status not in self.TRANSITIONS.get(expected, []):
+            raise ValueError(f'Недопустимый переход {expected} -> {new_status}')
+        
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(pk=self.pk, status=expected).update(status=new_status, updated_at=now)
+            if not updated:
+                return False
+            order_status_changed.send(sender=Order, order_ids=[self.pk], from_status=expected, to_status=new_status)
+        self.status = new_status
+        self.updated_at = now
+        return True
+    
+    @classmethod
+    def bulk_transition(cls, order_ids, from_status, to_status):
+        """Переводит много заказов одним UPDATE; возвращает id перешедших.
+        
+        Как и transition, шлет order_status_changed внутри транзакции.
+        """
+        if to_status not in cls.TRANSITIONS.get(from_status, []):
+            raise ValueError(f'Недопустимый переход {from_status} -> {to_status}')
+        
+        now = timezone.now()
+        with transaction.atomic():
+            updated = cls.objects.filter(pk__in=order_ids, status=from_status).update(
+                status=to_status, updated_at=now
+            )
+            # Строки, обновленные именно этим UPDATE, узнаем по метке времени
+            changed = list(
+                cls.objects.filter(pk__in=order_ids, status=to_status, updated_at=now)
+                .order_by().values_list('id', flat=True)
+            ) if updated else []
+            if changed:
+                order_status_changed.send(sender=cls, order_ids=changed, from_status=from_status, to_status=to_status)
+        return changed
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -74,3 +206,101 @@ class OrderItem(models.Model):
     
     def get_total(self):
         return self.price_at_time * self.quantity
+
+class DailySales(models.Model):
+    """Сводка продаж за день по блюду; dish=None - итог дня по всем заказам.
+
+    orders - оформлено заказов (вместе с отмененными позже), cancelled -
+    из них отменено; quantity и revenue - без отмененных. Обновляется
+    приращениями и пересчитывается командой rebuild_daily_sales (orders/sales.py).
+    """
+    date = models.DateField(verbose_name='День')
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='daily_sales', verbose_name='Блюдо')
+    # Без CHECK >= 0: отмена заказа, еще не попавшего в сводку, временно уводит счетчики в минус
+    orders = models.IntegerField(default=0, verbose_name='Заказов')
+    cancelled = models.IntegerField(default=0, verbose_name='Отменено')
+    quantity = models.IntegerField(default=0, verbose_name='Порций')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Выручка')
+    
+    class Meta:
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = 'Продажи по дням'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'dish'], name='daily_sales_dish_uniq'),
+            # NULL в уникальном ключе не совпадает сам с собой - итог дня отдельным частичным индексом
+            models.UniqueConstraint(fields=['date'], condition=models.Q(dish__isnull=True),
+                                    name='daily_sales_total_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: {self.dish or 'итого'}"
+
+class ArchivedOrder(models.Model):
+    """Завершенный заказ, перенесенный из Order в архив (orders/archive.py); только для чтения"""
+    # Тот же id, что был у заказа: ссылки на заказ продолжают работать
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                                 related_name='archived_orders', verbose_name='Ученик')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='Статус')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Общая сумма')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    notes = models.TextField(blank=True, verbose_name='Примечания')
+    item_count = models.PositiveIntegerField(default=0, verbose_name='Порций')
+    items_summary = models.CharField(max_length=255, blank=True, verbose_name='Состав')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+    
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        ordering = ['-created_at']
+        indexes = [
+            # История заказов ученика (orders/archive.py)
+            models.Index(fields=['customer', '-created_at', '-id'], name='archived_customer_created_idx'),
+            # Отчеты и пересчет сводки продаж за период
+            models.Index(fields=['-created_at', '-id'], name='archived_created_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Архивный заказ #{self.id}"
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    # Блюдо могут удалить, а история должна остаться - название хранится отдельно
+    dish = models.ForeignKey(Dish, on_delete=models.SET_NULL, null=True, verbose_name='Блюдо')
+    dish_name = models.CharField(max_length=200, verbose_name='Название блюда')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price_at_time = models.DecimalField(max_digits=10, decimal_places=2,
+                                        verbose_name='Цена на момент заказа')
+    
+    class Meta:
+        verbose_name = 'Элемент архивного заказа'
+        verbose_name_plural = 'Элементы архивных заказов'
+    
+    def __str__(self):
+        return f"{self.dish_name} x {self.quantity}"
+    
+    def get_total(self):
+        return self.price_at_time * self.quantity
+
+class DemandForecast(models.Model):
+    """Ожидаемый спрос на блюдо в день; пишет команда forecast_demand (orders/forecast.py)"""
+    date = models.DateField(verbose_name='День')
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='forecasts', verbose_name='Блюдо')
+    expected = models.FloatField(verbose_name='Ожидается порций')
+    # С запасом на разброс спроса: столько порций советуем заготовить
+    recommended = models.PositiveIntegerField(verbose_name='Заготовить порций')
+    created_at = models.DateTimeField(auto_now=True, verbose_name='Рассчитано')
+    
+    class Meta:
+        verbose_name = 'Прогноз спроса'
+        verbose_name_plural = 'Прогнозы спроса'
+        ordering = ['date', 'dish']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'dish'], name='forecast_date_dish_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: {self.dish} ~{self.expected:.1f}"
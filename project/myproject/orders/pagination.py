@@ -0,0 +1,67 @@
+"""Постраничный вывод заказов по ключу (created_at, id) вместо OFFSET.
+
+Курсор - это позиция последнего заказа на странице, поэтому запрос
+следующей страницы идет по индексу с того же места и стоит одинаково
+на любой глубине.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+ORDERS_PAGE_SIZE = 20
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(order):
+    raw = f'{order.created_at.isoformat()}|{order.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, id); ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Некорректный курсор: {cursor!r}') from e
+
+
+def _after(queryset, position):
+    queryset = queryset.order_by('-created_at', '-id')
+    if position:
+        created_at, pk = position
+        # (created_at, id) < (курсор) в форме, которая идет диапазоном по индексу
+        queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+    return queryset
+
+
+def paginate_orders(queryset, cursor=None, page_size=ORDERS_PAGE_SIZE):
+    """Страница заказов от новых к старым, начиная после cursor"""
+    return paginate_history([queryset], cursor, page_size)
+
+
+def paginate_history(querysets, cursor=None, page_size=ORDERS_PAGE_SIZE):
+    """То же по нескольким таблицам (заказы и архив): из каждой берется
+    страница по тому же курсору, результаты сливаются - запрос на таблицу"""
+    position = decode_cursor(cursor) if cursor else None
+    parts = [list(_after(queryset, position)[:page_size + 1]) for queryset in querysets]
+    merged = heapq.merge(*parts, key=lambda order: (order.created_at, order.pk), reverse=True)
+    items = list(merged)[:page_size + 1]
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return KeysetPage(items[:page_size], next_cursor)
@@ -0,0 +1,131 @@
+"""Отчеты по заказам за период: построчная выгрузка и агрегаты.
+
+Отчеты по дням и блюдам читают сводку DailySales (orders/sales.py),
+построчный и по ученикам - заказы вместе с архивом (orders/archive.py).
+Строки читаются .iterator(chunk_size=...), так что выгрузка за год идет
+потоком и не собирается в памяти. Общий код для представления reports_export и
+команды export_report.
+"""
+import csv
+import heapq
+from datetime import timedelta
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import sales
+from .models import ArchivedOrderItem, Order, OrderItem
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'xlsx')
+DEFAULT_PERIOD_DAYS = 30
+
+_line_total = ExpressionWrapper(F('quantity') * F('price_at_time'), output_field=DecimalField(max_digits=12, decimal_places=2))
+_STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+def _orders(date_from, date_to):
+    """Позиции заказов построчно; рабочая таблица и архив сливаются по дате"""
+    start, end = sales.day_bounds(date_from, date_to)
+    sources = []
+    for item_model, dish_name in ((OrderItem, 'dish__name'), (ArchivedOrderItem, 'dish_name')):
+        rows = (
+            item_model.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+            .annotate(line_total=_line_total)
+            .order_by('order__created_at', 'order_id', 'id')
+            .values_list('order_id', 'order__created_at', 'order__customer__username', 'order__status',
+                         dish_name, 'quantity', 'price_at_time', 'line_total')
+        )
+        sources.append(rows.iterator(chunk_size=CHUNK_SIZE))
+    merged = heapq.merge(*sources, key=lambda row: (row[1], row[0]))
+    for order_id, created_at, username, status, dish, quantity, price, total in merged:
+        yield (order_id, timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M'), username,
+               _STATUS_LABELS.get(status, status), dish, quantity, price, total)
+
+
+def _daily(date_from, date_to):
+    """По дням: заказы, отмены, порции и выручка без отмененных"""
+    for day, *values in sales.totals_by_day(date_from, date_to).iterator(chunk_size=CHUNK_SIZE):
+        yield day.isoformat(), *values
+
+
+def _dishes(date_from, date_to):
+    """По блюдам: порции, заказы и выручка без отмененных"""
+    return sales.totals_by_dish(date_from, date_to).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _students(date_from, date_to):
+    """По ученикам: заказы, порции и сумма без отмененных; с архивом.
+
+    Итоги двух таблиц складываются в памяти - строк не больше, чем учеников.
+    """
+    start, end = sales.day_bounds(date_from, date_to)
+    totals = {}
+    for order_model, _ in sales.SOURCES:
+        rows = (
+            order_model.objects.filter(created_at__gte=start, created_at__lt=end)
+            .exclude(status='cancelled')
+            .values('customer_id')
+            .annotate(orders=Count('id'), portions=Sum('item_count'), revenue=Sum('total_price'))
+            .order_by()
+            .values_list('customer_id', 'customer__username', 'customer__first_name', 'customer__last_name',
+                         'orders', 'portions', 'revenue')
+        )
+        for customer_id, username, first_name, last_name, orders, portions, revenue in rows.iterator(chunk_size=CHUNK_SIZE):
+            row = totals.setdefault(customer_id, [username, first_name, last_name, 0, 0, 0])
+            row[3] += orders
+            row[4] += portions or 0
+            row[5] += revenue
+    return (tuple(row) for _, row in sorted(totals.items(), key=lambda item: (-item[1][5], item[0])))
+
+
+# отчет: (название, заголовок, функция строк)
+REPORTS = {
+    'orders': ('Позиции заказов', ['Заказ', 'Дата', 'Ученик', 'Статус', 'Блюдо', 'Количество', 'Цена', 'Сумма'], _orders),
+    'daily': ('По дням', ['День', 'Заказов', 'Отменено', 'Порций', 'Выручка'], _daily),
+    'dishes': ('По блюдам', ['Блюдо', 'Категория', 'Порций', 'Заказов', 'Выручка'], _dishes),
+    'students': ('По ученикам', ['Логин', 'Имя', 'Фамилия', 'Заказов', 'Порций', 'Сумма'], _students),
+}
+
+
+def parse_period(date_from, date_to):
+    """Даты 'YYYY-MM-DD' включительно; по умолчанию - последние DEFAULT_PERIOD_DAYS дней"""
+    today = timezone.localdate()
+    try:
+        date_to = parse_date(date_to) if date_to else today
+        date_from = parse_date(date_from) if date_from else date_to - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    except ValueError:
+        date_to = date_from = None
+    if date_from is None or date_to is None:
+        raise ValueError('Даты в формате ГГГГ-ММ-ДД')
+    if date_from > date_to:
+        raise ValueError('Начало периода позже конца')
+    return date_from, date_to
+
+
+def report_rows(report, date_from, date_to):
+    """(заголовок, итератор строк) отчета за даты включительно, по местному времени"""
+    if report not in REPORTS:
+        raise ValueError(f'Неизвестный отчет: {report}')
+    _, header, rows = REPORTS[report]
+    return header, rows(date_from, date_to)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: writerow возвращает готовую строку"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """Строки CSV по одной; BOM - чтобы Excel узнал UTF-8"""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def filename(report, date_from, date_to, fmt):
+    return f'{report}_{date_from:%Y%m%d}-{date_to:%Y%m%d}.{fmt}'
@@ -0,0 +1,182 @@
+"""Сводка продаж по дням (модель DailySales).
+
+Строка (день, блюдо) хранит, сколько заказов с блюдом оформлено и
+сколько из них отменено, а также порции и выручку без отмененных.
+Строка с dish=None - итог дня. Панель администратора и отчеты читают
+сводку, поэтому их скорость не зависит от объема истории заказов.
+
+Сводка обновляется приращениями: place_order вызывает record_order,
+отмена заказа (signals.py) - record_cancellation. Счетчики меняются
+UPDATE ... SET x = x + CASE ... END - одним запросом на день, так что
+параллельные заказы не теряются, а число запросов не зависит от размера
+заказа.
+Заказы, созданные в обход place_order (bulk_create, админка), а также
+правки задним числом в сводку не попадают - ее пересчитывает
+команда rebuild_daily_sales, по рабочим таблицам и архиву заказов.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, DailySales, Order, OrderItem
+
+_COUNTERS = ('orders', 'cancelled', 'quantity', 'revenue')
+_ZEROS = (0, 0, 0, Decimal('0'))
+
+
+def _deltas():
+    return defaultdict(lambda: list(_ZEROS))
+
+
+def _add(deltas, key, *values):
+    row = deltas[key]
+    for i, value in enumerate(values):
+        row[i] += value
+
+
+def _apply(deltas):
+    """Прибавляет {(день, dish_id или None): [orders, cancelled, quantity, revenue]}"""
+    by_day = defaultdict(dict)
+    for (day, dish_id), values in deltas.items():
+        by_day[day][dish_id] = values
+    with transaction.atomic():
+        # Недостающие строки - нулями; существующие (в т.ч. вставленные параллельно) пропускаются
+        DailySales.objects.bulk_create(
+            [DailySales(date=day, dish_id=dish_id) for day, dish_id in deltas], ignore_conflicts=True,
+        )
+        # Дни по порядку - меньше взаимных блокировок на PostgreSQL
+        for day, rows in sorted(by_day.items()):
+            changes = {}
+            for i, field in enumerate(_COUNTERS):
+                whens = [
+                    When(Q(dish__isnull=True) if dish_id is None else Q(dish_id=dish_id), then=Value(values[i]))
+                    for dish_id, values in rows.items() if values[i]
+                ]
+                if whens:
+                    changes[field] = F(field) + Case(*whens, default=Value(_ZEROS[i]))
+            selected = Q(dish_id__in=[dish_id for dish_id in rows if dish_id is not None])
+            if None in rows:
+                selected |= Q(dish__isnull=True)
+            DailySales.objects.filter(selected, date=day).update(**changes)
+
+
+def record_order(order, lines):
+    """Новый заказ; lines - [(dish_id, quantity, price)]"""
+    day = timezone.localdate(order.created_at)
+    deltas = _deltas()
+    _add(deltas, (day, None), 1, 0, sum(quantity for _, quantity, _ in lines), order.total_price)
+    for dish_id, quantity, price in lines:
+        _add(deltas, (day, dish_id), 1, 0, quantity, price * quantity)
+    _apply(deltas)
+
+
+def record_cancellation(order_ids):
+    """Отмена заказов: +1 к cancelled, порции и выручка вычитаются"""
+    deltas = _deltas()
+    orders = Order.objects.filter(pk__in=order_ids).values_list('created_at', 'total_price')
+    for created_at, total_price in orders:
+        _add(deltas, (timezone.localdate(created_at), None), 0, 1, 0, -total_price)
+    items = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list('order__created_at', 'dish_id', 'quantity', 'price_at_time')
+    )
+    for created_at, dish_id, quantity, price in items:
+        day = timezone.localdate(created_at)
+        _add(deltas, (day, None), 0, 0, -quantity, 0)
+        _add(deltas, (day, dish_id), 0, 1, -quantity, -price * quantity)
+    if deltas:
+        _apply(deltas)
+
+
+def day_bounds(date_from, date_to):
+    """Полуинтервал [начало date_from, начало следующего за date_to дня) по местному времени"""
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+# (заказы, позиции): рабочие таблицы и архив (orders/archive.py)
+SOURCES = [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]
+
+
+def _aggregate(order_model, item_model, start, end, deltas):
+    """Прибавляет к deltas итоги дней и блюд по одной паре таблиц"""
+    not_cancelled = ~Q(order__status='cancelled')
+    line_total = ExpressionWrapper(F('quantity') * F('price_at_time'),
+                                   output_field=DecimalField(max_digits=12, decimal_places=2))
+    dishes = (
+        item_model.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'dish_id')
+        .annotate(
+            order_count=Count('order_id', distinct=True),
+            cancelled_count=Count('order_id', distinct=True, filter=Q(order__status='cancelled')),
+            portions=Sum('quantity', filter=not_cancelled),
+            total=Sum(line_total, filter=not_cancelled),
+        )
+        .order_by()
+    )
+    totals = (
+        order_model.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(
+            order_count=Count('id'),
+            cancelled_count=Count('id', filter=Q(status='cancelled')),
+            total=Sum('total_price', filter=~Q(status='cancelled')),
+        )
+        .order_by()
+    )
+
+    for row in dishes:
+        portions = row['portions'] or 0
+        _add(deltas, (row['day'], None), 0, 0, portions, 0)
+        # Позиции архива с удаленным блюдом идут только в итог дня
+        if row['dish_id'] is not None:
+            _add(deltas, (row['day'], row['dish_id']), row['order_count'], row['cancelled_count'],
+                 portions, row['total'] or 0)
+    for row in totals:
+        _add(deltas, (row['day'], None), row['order_count'], row['cancelled_count'], 0, row['total'] or 0)
+
+
+def rebuild(date_from, date_to):
+    """Пересчитывает сводку за дни date_from..date_to включительно; возвращает число строк"""
+    start, end = day_bounds(date_from, date_to)
+    deltas = _deltas()
+    for order_model, item_model in SOURCES:
+        _aggregate(order_model, item_model, start, end, deltas)
+    rows = [
+        DailySales(date=day, dish_id=dish_id, **dict(zip(_COUNTERS, values)))
+        for (day, dish_id), values in deltas.items()
+    ]
+
+    with transaction.atomic():
+        DailySales.objects.filter(date__gte=date_from, date__lte=date_to).delete()
+        DailySales.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def totals_by_day(date_from, date_to):
+    """Итоги дней периода: (день, заказов, отменено, порций, выручка), дни без заказов пропускаются"""
+    return (
+        DailySales.objects.filter(dish__isnull=True, date__gte=date_from, date__lte=date_to)
+        .order_by('date')
+        .values_list('date', 'orders', 'cancelled', 'quantity', 'revenue')
+    )
+
+
+def totals_by_dish(date_from, date_to):
+    """Блюда за период по убыванию выручки: (блюдо, категория, порций, заказов без отмен, выручка)"""
+    return (
+        DailySales.objects.filter(dish__isnull=False, date__gte=date_from, date__lte=date_to)
+        .values('dish_id')
+        .annotate(portions=Sum('quantity'), order_count=Sum(F('orders') - F('cancelled')), total=Sum('revenue'))
+        .filter(order_count__gt=0)
+        .order_by('-total', 'dish_id')
+        .values_list('dish__name', 'dish__category__name', 'portions', 'order_count', 'total')
+    )
@@ -0,0 +1,143 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+
+from . import events, sales, slots
+from .menu_cache import bump_menu_version
+from .models import Dish, Order, OrderItem
+
+
+class DishUnavailable(Exception):
+    """Часть блюд из корзины больше недоступна"""
+    def __init__(self, dish_ids):
+        self.dish_ids = list(dish_ids)
+        super().__init__(f'Недоступные блюда: {self.dish_ids}')
+
+
+class OutOfStock(DishUnavailable):
+    """Порций части блюд не хватает на заказ"""
+
+
+def _by_dish(quantities):
+    """CASE id WHEN ... THEN количество - сдвиг остатка каждому блюду в одном UPDATE"""
+    return Case(*[When(pk=dish_id, then=Value(quantity)) for dish_id, quantity in quantities.items()],
+                default=Value(0))
+
+
+def _take_stock(dishes, quantities):
+    """Списывает порции блюд с учетом остатка одним условным UPDATE.
+
+    WHERE stock >= n по каждому блюду: если обновились не все строки,
+    порции кто-то успел забрать - OutOfStock, транзакция place_order
+    откатывает и частичное списание. Блюда, дошедшие до нуля, снимаются
+    с продажи; кэш меню сбрасывается после коммита.
+    """
+    tracked = {dish_id: quantity for dish_id, quantity in quantities.items() if dishes[dish_id].stock is not None}
+    if not tracked:
+        return
+    short = [dish_id for dish_id, quantity in tracked.items() if dishes[dish_id].stock < quantity]
+    if not short:
+        enough = Q()
+        for dish_id, quantity in tracked.items():
+            enough |= Q(pk=dish_id, stock__gte=quantity)
+        if Dish.objects.filter(enough).update(stock=F('stock') - _by_dish(tracked)) < len(tracked):
+            # Остаток изменился между чтением и списанием - какому блюду не хватило, неизвестно
+            short = list(tracked)
+    if short:
+        raise OutOfStock(short)
+
+    close_sold_out(list(tracked))
+
+
+def close_sold_out(dish_ids):
+    """Снимает с продажи блюда с нулевым остатком; возвращает их число"""
+    closed = Dish.objects.filter(pk__in=dish_ids, stock=0, is_available=True).update(is_available=False)
+    if closed:
+        # update() не шлет сигналы; до коммита новый снимок меню прочитал бы старые данные
+        transaction.on_commit(bump_menu_version)
+    return closed
+
+
+def set_stock(dish_id, stock):
+    """Ставит остаток вручную (админка); на нуле блюдо снимается с продажи"""
+    changes = {'stock': stock}
+    if stock == 0:
+        changes['is_available'] = False
+    if Dish.objects.filter(pk=dish_id).update(**changes):
+        transaction.on_commit(bump_menu_version)
+
+
+def restock(order_ids):
+    """Возвращает на остаток порции отмененных заказов.
+
+    Снятое с продажи блюдо обратно не включается - это решает повар.
+    """
+    returned = dict(
+        OrderItem.objects.filter(order_id__in=order_ids, dish__stock__isnull=False)
+        .values_list('dish_id').annotate(quantity=Sum('quantity')).order_by()
+    )
+    if returned:
+        Dish.objects.filter(pk__in=list(returned)).update(stock=F('stock') + _by_dish(returned))
+
+
+def _normalize_cart(cart):
+    """Приводит корзину из сессии к виду {dish_id: quantity}"""
+    quantities = {}
+    for dish_id, quantity in cart.items():
+        try:
+            dish_id = int(dish_id)
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[dish_id] = quantity
+    return quantities
+
+
+@transaction.atomic
+def place_order(customer, cart, status='preparing', slot_id=None):
+    """Оформление заказа из корзины одной транзакцией.
+
+    Все блюда выбираются одним запросом, сумма считается до вставки
+    заказа, позиции пишутся одним bulk_create. Число запросов не
+    зависит от размера корзины.
+
+    С slot_id это предзаказ: порции резервируются в слоте (см. slots.py,
+    SlotUnavailable при нехватке), заказ ждет слота в статусе confirmed.
+    Порции блюд с учетом остатка списываются атомарно (OutOfStock).
+    """
+    quantities = _normalize_cart(cart)
+    if not quantities:
+        raise ValueError('Корзина пуста')
+
+    dishes = Dish.objects.filter(is_available=True).in_bulk(list(quantities))
+    missing = [dish_id for dish_id in quantities if dish_id not in dishes]
+    if missing:
+        raise DishUnavailable(missing)
+
+    _take_stock(dishes, quantities)
+
+    total = sum(
+        (dishes[dish_id].price * quantity for dish_id, quantity in quantities.items()),
+        Decimal('0'),
+    )
+    order = Order(customer=customer, status=status, total_price=total)
+    order.set_items_summary([(dishes[dish_id].name, quantity) for dish_id, quantity in quantities.items()])
+    if slot_id is not None:
+        slots.reserve(slot_id, order.item_count)
+        order.slot_id = slot_id
+        order.status = 'confirmed'
+    order.save()
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            dish=dishes[dish_id],
+            quantity=quantity,
+            price_at_time=dishes[dish_id].price,
+        )
+        for dish_id, quantity in quantities.items()
+    ])
+    sales.record_order(order, [(dish_id, quantity, dishes[dish_id].price) for dish_id, quantity in quantities.items()])
+    events.order_created(order, [(dishes[dish_id], quantity) for dish_id, quantity in quantities.items()])
+    return order
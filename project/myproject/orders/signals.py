@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from myproject import images
+from users.models import CustomUser
+from . import events, sales, slots
+from .models import Category, Dish, Order, order_status_changed
+from .menu_cache import bump_menu_version
+from .dashboard import invalidate_dashboard_stats
+from .kitchen import invalidate_kitchen_summary
+from .services import restock
+
+
+def _saves_field(name, raw, update_fields):
+    return not raw and (update_fields is None or name in update_fields)
+
+
+@receiver(pre_save, sender=Dish)
+def build_dish_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Миниатюры блюда пишутся тем же UPDATE, что и само блюдо"""
+    if _saves_field('image', raw, update_fields):
+        instance.image_variants = images.refresh_variants(instance.image, instance.image_variants, images.DISH_IMAGE)
+
+
+@receiver(pre_save, sender=CustomUser)
+def build_avatar_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    # save(update_fields=['last_login']) при входе и т.п. изображение не трогает
+    if _saves_field('avatar', raw, update_fields):
+        instance.avatar_variants = images.refresh_variants(instance.avatar, instance.avatar_variants, images.AVATAR)
+
+
+@receiver([post_save, post_delete], sender=Dish)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_menu(sender, **kwargs):
+    """Изменение блюда или категории сбрасывает кэш меню.
+
+    После коммита: иначе параллельный запрос успеет собрать под новой
+    версией снимок из еще не записанных данных.
+    """
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Dish)
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_dashboard(sender, **kwargs):
+    """Сбрасывает кэш счетчиков панели администратора после коммита"""
+    transaction.on_commit(invalidate_dashboard_stats)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_kitchen(sender, **kwargs):
+    """Сводка кухни - после коммита, когда позиции заказа уже записаны"""
+    transaction.on_commit(invalidate_kitchen_summary)
+
+
+@receiver(order_status_changed)
+def on_order_status_changed(sender, order_ids, from_status, to_status, **kwargs):
+    if to_status == 'cancelled':
+        sales.record_cancellation(order_ids)
+        slots.release(order_ids)
+        restock(order_ids)
+    # Вызывается в транзакции перехода: кэши и события - после коммита
+    transaction.on_commit(invalidate_dashboard_stats)
+    transaction.on_commit(invalidate_kitchen_summary)
+    for order_id in order_ids:
+        events.order_updated(order_id, to_status)
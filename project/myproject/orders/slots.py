@@ -0,0 +1,100 @@
+"""Предзаказ на перемену: слоты выдачи с лимитом порций.
+
+Заказ на слот занимает item_count порций одним условным UPDATE
+
+    UPDATE ... SET reserved = reserved + n WHERE id = ? AND reserved <= capacity - n
+
+в транзакции place_order, поэтому параллельные заказы не превысят
+лимит. Предзаказ создается в статусе confirmed и уходит на кухню
+(preparing) за PREP_LEAD_MINUTES до начала слота - release_due_orders
+вызывает команда release_slot_orders, ее нужно запускать по cron раз в
+минуту. Доска кухни узнает о переданных заказах сама (released_since).
+Отмена заказа возвращает порции слоту (signals.py).
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Order, TimeSlot
+
+# За сколько минут до начала слота заказ уходит на кухню; позже записаться нельзя
+PREP_LEAD_MINUTES = 20
+# На сколько дней вперед показывать слоты для записи
+BOOKING_DAYS = 2
+
+
+class SlotUnavailable(Exception):
+    """Слот не найден, закрыт, скоро начнется или в нем не хватает порций"""
+    def __init__(self, slot_id):
+        self.slot_id = slot_id
+        super().__init__(f'Слот {slot_id} недоступен')
+
+
+def _booking_opens(now):
+    return (now or timezone.now()) + timedelta(minutes=PREP_LEAD_MINUTES)
+
+
+def bookable_slots(now=None, days=BOOKING_DAYS):
+    """Слоты, на которые еще можно записаться, по времени начала"""
+    opens = _booking_opens(now)
+    return TimeSlot.objects.filter(
+        is_active=True,
+        starts_at__gt=opens,
+        starts_at__lt=opens + timedelta(days=days),
+        reserved__lt=F('capacity'),
+    ).order_by('starts_at')
+
+
+def reserve(slot_id, portions, now=None):
+    """Занимает порции в слоте; SlotUnavailable, если места нет"""
+    updated = TimeSlot.objects.filter(
+        pk=slot_id,
+        is_active=True,
+        starts_at__gt=_booking_opens(now),
+        reserved__lte=F('capacity') - portions,
+    ).update(reserved=F('reserved') + portions)
+    if not updated:
+        raise SlotUnavailable(slot_id)
+
+
+def release(order_ids):
+    """Возвращает слотам порции отмененных заказов"""
+    freed = (
+        Order.objects.filter(pk__in=order_ids, slot__isnull=False)
+        .values('slot_id').annotate(portions=Sum('item_count')).order_by('slot_id')
+    )
+    with transaction.atomic():
+        for row in freed:
+            TimeSlot.objects.filter(pk=row['slot_id']).update(reserved=F('reserved') - row['portions'])
+
+
+def release_due_orders(now=None):
+    """Переводит на кухню предзаказы, чьи слоты скоро начнутся; возвращает их id"""
+    due = list(
+        Order.objects.filter(status='confirmed', slot__starts_at__lte=_booking_opens(now))
+        .order_by().values_list('id', flat=True)
+    )
+    return Order.bulk_transition(due, 'confirmed', 'preparing') if due else []
+
+
+def released_since(since):
+    """id предзаказов, переданных на кухню после since"""
+    return list(
+        Order.objects.filter(status='preparing', slot__isnull=False, updated_at__gt=since)
+        .order_by().values_list('id', flat=True)
+    )
+
+
+def create_slots(day, first, last, minutes, capacity):
+    """Слоты по minutes минут с first до last (time) на день day; существующие не трогаются"""
+    start = timezone.make_aware(datetime.combine(day, first))
+    end = timezone.make_aware(datetime.combine(day, last))
+    step = timedelta(minutes=minutes)
+    slots = []
+    while start + step <= end:
+        slots.append(TimeSlot(starts_at=start, ends_at=start + step, capacity=capacity))
+        start += step
+    TimeSlot.objects.bulk_create(slots, ignore_conflicts=True)
+    return len(slots)
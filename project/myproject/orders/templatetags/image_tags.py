@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html
+
+from myproject import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(field_file, variants, sizes='100vw', alt='', css_class='', style=''):
+    """<picture> с вариантами WebP и JPEG и ленивой загрузкой.
+
+    {% picture dish.image dish.image_variants sizes="(min-width: 768px) 300px, 100vw" alt=dish.name %}
+
+    Если вариантов еще нет (не запускали build_image_variants) - отдается оригинал.
+    """
+    if not field_file:
+        return ''
+    if not variants or not variants.get('jpeg'):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">',
+            field_file.url, alt, css_class, style,
+        )
+    storage = field_file.storage
+    width, height = variants['size']
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" style="{}" '
+        'loading="lazy" decoding="async">'
+        '</picture>',
+        images.srcset(variants, 'webp', storage), sizes,
+        storage.url(variants['jpeg'][-1][1]), images.srcset(variants, 'jpeg', storage), sizes,
+        width, height, alt, css_class, style,
+    )
+
+
+@register.simple_tag
+def srcset(field_file, variants, ext='jpeg'):
+    """Только строка srcset для своей разметки: srcset="{% srcset dish.image dish.image_variants 'webp' %}" """
+    if not field_file or not variants:
+        return ''
+    return images.srcset(variants, ext, field_file.storage)
@@ -1,3 +1,1240 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только прогнозу спроса
+    np = None
+
+from users.models import CustomUser
+from . import archive, events, menu_cache, menu_io, reports, sales, slots
+from .models import ArchivedOrder, Category, DailySales, DemandForecast, Dish, Order, OrderItem, TimeSlot
+from .services import place_order, DishUnavailable, OutOfStock
+from .slots import SlotUnavailable
+from .dashboard import get_dashboard_stats
+from .menu_cache import get_menu
+from .pagination import paginate_orders, encode_cursor
+from .kitchen import get_kitchen_summary
+from .cart import MAX_CART_QUANTITY, Cart
+
+if np is not None:
+    from . import forecast
+
+
+class CanteenTestCase(TestCase):
+    """Общие данные для тестов: категория, блюда и пользователи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user('student', password='pass', role='student')
+        cls.chef = CustomUser.objects.create_user('chef', password='pass', role='chef')
+        cls.admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        cls.category = Category.objects.create(name='Супы')
+        cls.dishes = [
+            Dish.objects.create(
+                name=f'Блюдо {i}', description='', price=Decimal('10.50') + i,
+                category=cls.category,
+            )
+            for i in range(50)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def cart_for(self, dishes, quantity=2):
+        return {str(dish.id): quantity for dish in dishes}
+
+
+class PlaceOrderTests(CanteenTestCase):
+
+    def test_total_and_items(self):
+        order = place_order(self.student, self.cart_for(self.dishes[:3]))
+        self.assertEqual(order.status, 'preparing')
+        self.assertEqual(order.items.count(), 3)
+        expected = sum(dish.price * 2 for dish in self.dishes[:3])
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, expected)
+        self.assertEqual(order.item_count, 6)
+        self.assertEqual(order.items_summary, 'Блюдо 0 ×2, Блюдо 1 ×2, Блюдо 2 ×2')
+
+    def test_unavailable_dish_rolls_back(self):
+        self.dishes[1].is_available = False
+        self.dishes[1].save()
+        with self.assertRaises(DishUnavailable) as ctx:
+            place_order(self.student, self.cart_for(self.dishes[:3]))
+        self.assertEqual(ctx.exception.dish_ids, [self.dishes[1].id])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_query_count_does_not_grow_with_cart(self):
+        counts = {}
+        for size in (1, 10, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(self.student, self.cart_for(self.dishes[:size]))
+            counts[size] = len(ctx.captured_queries)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_create_order_view(self):
+        self.client.force_login(self.student)
+        session = self.client.session
+        session['cart'] = self.cart_for(self.dishes[:2], quantity=1)
+        session.save()
+        response = self.client.post(reverse('create_order'))
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_detail', args=[order.id]))
+        self.assertNotIn('cart', self.client.session)
+
+
+class MenuCacheTests(CanteenTestCase):
+
+    def test_unknown_categories_are_not_memoized(self):
+        for category_id in range(1000, 1100):
+            self.assertEqual(get_menu(category_id)['dishes'], [])
+        get_menu(self.category.id)
+        self.assertEqual(set(menu_cache._local['menus']), {'all', self.category.id})
+
+    def test_process_snapshot_expires(self):
+        get_menu()
+        # Изменение в другом процессе: версия в кэше этого процесса не меняется
+        Dish.objects.filter(pk=self.dishes[0].pk).update(is_available=False)
+        self.assertIn(self.dishes[0], get_menu()['dishes'])
+        later = menu_cache.MENU_LOCAL_TTL + 1
+        with mock.patch('time.monotonic', return_value=time.monotonic() + later), \
+                mock.patch('time.time', return_value=time.time() + later):
+            self.assertNotIn(self.dishes[0], get_menu()['dishes'])
+
+    def test_cached_menu_render_issues_no_queries(self):
+        self.client.get(reverse('menu'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('menu'))
+        self.assertEqual(len(response.context['dishes']), 50)
+
+    def test_category_view_is_filtered_from_snapshot(self):
+        other = Category.objects.create(name='Напитки')
+        Dish.objects.create(name='Компот', description='', price=5, category=other)
+        self.client.get(reverse('menu'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('menu'), {'category': other.id})
+        self.assertEqual([d.name for d in response.context['dishes']], ['Компот'])
+
+    def test_dish_change_bumps_version(self):
+        self.client.get(reverse('menu'))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.dishes[0].is_available = False
+            self.dishes[0].save()
+            # До коммита версия прежняя - в кэш не попадет снимок из незаписанных данных
+            self.assertIn(self.dishes[0], self.client.get(reverse('menu')).context['dishes'])
+        self.assertTrue(callbacks)
+        response = self.client.get(reverse('menu'))
+        self.assertNotIn(self.dishes[0], response.context['dishes'])
+
+
+class CartTests(CanteenTestCase):
+
+    def set_cart(self, cart):
+        session = self.client.session
+        session['cart'] = cart
+        session.save()
+
+    def cart_queries(self, dishes):
+        self.set_cart(self.cart_for(dishes))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('view_cart'))
+        return len(ctx.captured_queries)
+
+    def test_view_cart_uses_constant_queries(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.cart_queries(self.dishes[:1]), self.cart_queries(self.dishes[:15]))
+
+    def test_unavailable_dishes_are_dropped_and_reported(self):
+        self.client.force_login(self.student)
+        self.dishes[0].is_available = False
+        self.dishes[0].save()
+        self.set_cart(self.cart_for(self.dishes[:3]))
+        response = self.client.get(reverse('view_cart'))
+        self.assertEqual(len(response.context['cart_items']), 2)
+        self.assertEqual(response.context['total'], (self.dishes[1].price + self.dishes[2].price) * 2)
+        self.assertContains(response, self.dishes[0].name)
+        self.assertNotIn(self.dishes[0].id, Cart(self.client.session))
+
+    def test_add_update_remove(self):
+        self.client.force_login(self.student)
+        dish = self.dishes[0]
+        self.client.post(reverse('add_to_cart', args=[dish.id]))
+        self.client.post(reverse('add_to_cart', args=[dish.id]))
+        self.assertEqual(self.client.session['cart'], f'{dish.id}:2')
+        self.client.post(reverse('update_cart', args=[dish.id]), {'quantity': '5'})
+        self.assertEqual(self.client.session['cart'], f'{dish.id}:5')
+        self.client.get(reverse('remove_from_cart', args=[dish.id]))
+        self.assertNotIn('cart', self.client.session)
+
+    def test_compact_format_and_legacy_dict(self):
+        self.assertEqual(Cart.decode('12:3,45:1,x:2,7:0'), {12: 3, 45: 1})
+        self.assertEqual(Cart.decode({'12': 3, '45': '1'}), {12: 3, 45: 1})
+        self.assertEqual(Cart.encode({12: 3, 45: 1}), '12:3,45:1')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_sessions_do_not_touch_database(self):
+        self.client = Client()
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('add_to_cart', args=[self.dishes[0].id]))
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+        self.assertIn(self.dishes[0].id, Cart(self.client.session))
+
+
+class CartApiTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def test_add_returns_line_and_total_without_dish_queries(self):
+        dish = self.dishes[0]
+        self.client.get(reverse('menu'))  # прогрев кэша меню
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('cart_add_api', args=[dish.id]), {'quantity': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'orders_dish' in q['sql']])
+        data = response.json()
+        self.assertEqual(data['line'], {'dish_id': dish.id, 'quantity': 3, 'total': str(dish.price * 3)})
+        self.assertEqual(data['count'], 1)
+
+    def test_update_and_remove(self):
+        first, second = self.dishes[:2]
+        self.client.post(reverse('cart_add_api', args=[first.id]))
+        self.client.post(reverse('cart_add_api', args=[second.id]))
+        data = self.client.post(reverse('cart_update_api', args=[first.id]), {'quantity': '4'}).json()
+        self.assertEqual(data['total'], str(first.price * 4 + second.price))
+        data = self.client.post(reverse('cart_update_api', args=[first.id]), {'quantity': '0'}).json()
+        self.assertEqual(data['line']['quantity'], 0)
+        data = self.client.post(reverse('cart_remove_api', args=[second.id])).json()
+        self.assertEqual((data['count'], data['total']), (0, '0'))
+
+    def test_unavailable_dish_and_get_are_rejected(self):
+        self.dishes[0].is_available = False
+        self.dishes[0].save()
+        self.assertEqual(self.client.post(reverse('cart_add_api', args=[self.dishes[0].id])).status_code, 404)
+        url = reverse('cart_update_api', args=[self.dishes[0].id])
+        self.assertEqual(self.client.post(url, {'quantity': '2'}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'quantity': '0'}).status_code, 200)
+        self.assertNotIn(self.dishes[0].id, Cart(self.client.session))
+        self.assertEqual(self.client.get(reverse('cart_add_api', args=[self.dishes[1].id])).status_code, 405)
+
+    def test_repeated_add_is_clamped(self):
+        for _ in range(3):
+            self.client.post(reverse('cart_add_api', args=[self.dishes[0].id]), {'quantity': '4'})
+        self.assertEqual(Cart(self.client.session).data, {self.dishes[0].id: MAX_CART_QUANTITY})
+
+    def test_cart_state(self):
+        self.client.post(reverse('cart_add_api', args=[self.dishes[0].id]), {'quantity': '2'})
+        data = self.client.get(reverse('cart_api')).json()
+        self.assertEqual(data['lines'], [{'dish_id': self.dishes[0].id, 'quantity': 2,
+                                          'total': str(self.dishes[0].price * 2)}])
+
+
+class ChefOrdersTests(CanteenTestCase):
+
+    def create_preparing_orders(self, count):
+        orders = [Order(customer=self.student, status='preparing', total_price=0) for _ in range(count)]
+        for order in orders:
+            order.set_items_summary([(dish.name, 1) for dish in self.dishes[:3]])
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, dish=dish, quantity=1, price_at_time=dish.price)
+            for order in orders for dish in self.dishes[:3]
+        )
+
+    def queue_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('chef_orders'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_constant_queries_for_5_and_500_orders(self):
+        self.client.force_login(self.chef)
+        self.create_preparing_orders(5)
+        small = self.queue_queries()
+        self.create_preparing_orders(495)
+        self.assertEqual(self.queue_queries(), small)
+
+    def test_queue_renders_items(self):
+        self.client.force_login(self.chef)
+        self.create_preparing_orders(1)
+        response = self.client.get(reverse('chef_orders'))
+        self.assertContains(response, f'{self.dishes[0].name} ×1, {self.dishes[1].name} ×1')
+
+
+class KitchenEventsTests(CanteenTestCase):
+
+    def test_broker_delivers_to_subscribers(self):
+        broker = events.InProcessBroker()
+
+        async def scenario():
+            queue = broker.subscribe()
+            broker.publish({'event': 'order_updated', 'data': {'id': 1}})
+            event = await asyncio.wait_for(queue.get(), timeout=1)
+            broker.unsubscribe(queue)
+            return event
+
+        self.assertEqual(asyncio.run(scenario())['data'], {'id': 1})
+
+    def test_place_order_publishes_after_commit(self):
+        broker = mock.Mock()
+        with mock.patch.object(events, 'get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                order = place_order(self.student, self.cart_for(self.dishes[:2]))
+        event = broker.publish.call_args.args[0]
+        self.assertEqual(event['event'], 'order_created')
+        self.assertEqual(event['data']['id'], order.id)
+        self.assertEqual(len(event['data']['items']), 2)
+
+    def test_stream_requires_chef(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('kitchen_events')).status_code, 403)
+
+    async def test_stream_pushes_events(self):
+        await self.async_client.aforce_login(self.chef)
+        response = await self.async_client.get(reverse('kitchen_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        events.get_broker().publish({'event': 'order_updated', 'data': {'id': 7, 'status': 'ready'}})
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertIn(b'event: order_updated', chunk)
+        await stream.aclose()
+
+    async def test_stream_reports_preorders_released_elsewhere(self):
+        await self.async_client.aforce_login(self.chef)
+        with mock.patch('orders.views.KITCHEN_PING_SECONDS', 0.05):
+            response = await self.async_client.get(reverse('kitchen_events'))
+            stream = aiter(response.streaming_content)
+            await anext(stream)
+        # Команда release_slot_orders в другом процессе: в брокер этого процесса ничего не приходит
+        order = await Order.objects.acreate(customer=self.student, status='preparing', slot=await TimeSlot.objects.acreate(
+            starts_at=timezone.now(), ends_at=timezone.now() + timedelta(minutes=15), capacity=5))
+        with mock.patch.object(events, 'publish'):
+            chunks = [await asyncio.wait_for(anext(stream), timeout=1) for _ in range(2)]
+        self.assertIn(f'"id": {order.pk}, "status": "preparing"'.encode(), chunks[0])
+        self.assertEqual(chunks[1], b': ping\n\n')
+        await stream.aclose()
+
+
+class DashboardTests(CanteenTestCase):
+
+    def test_stats_are_computed_in_six_queries(self):
+        place_order(self.student, self.cart_for(self.dishes[:1], quantity=1))
+        Order.objects.create(customer=self.student, status='cancelled', total_price=100)
+        # Агрегаты по пользователям, блюдам, заказам и архиву + два запроса к сводке продаж
+        with self.assertNumQueries(6):
+            stats = get_dashboard_stats()
+        self.assertEqual(stats['total_students'], 1)
+        self.assertEqual(stats['total_chefs'], 1)
+        self.assertEqual(stats['total_orders'], 2)
+        self.assertEqual(stats['active_orders'], 1)
+        self.assertEqual(stats['cancelled_orders'], 1)
+        self.assertEqual(stats['revenue_today'], self.dishes[0].price)
+        self.assertEqual(len(stats['sales_days']), 7)
+        self.assertEqual(stats['top_dishes'], [(self.dishes[0].name, 'Супы', 1, 1, self.dishes[0].price)])
+
+    def test_stats_are_cached_and_invalidated(self):
+        get_dashboard_stats()
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=self.student, status='preparing')
+            # До коммита в кэше остаются прежние числа
+            self.assertEqual(get_dashboard_stats()['active_orders'], 0)
+        self.assertEqual(get_dashboard_stats()['active_orders'], 1)
+
+    def test_prep_time_of_preorder_starts_at_release(self):
+        now = timezone.now()
+        slot = TimeSlot.objects.create(starts_at=now + timedelta(minutes=slots.PREP_LEAD_MINUTES - 5),
+                                       ends_at=now + timedelta(hours=1), capacity=5)
+        Order.objects.create(customer=self.student, status='ready', slot=slot)
+        # Оформлен 10 минут назад, на кухню ушел 5 минут назад
+        Order.objects.update(created_at=now - timedelta(minutes=10), updated_at=now)
+        self.assertEqual(get_dashboard_stats()['avg_prep_minutes'], 5)
+
+    def test_dashboard_view(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'Выручка сегодня')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса проверяется на SQLite')
+class IndexUsageTests(CanteenTestCase):
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index_name}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_kitchen_queue(self):
+        self.assertUsesIndex(
+            Order.objects.filter(status='preparing').order_by('created_at'),
+            'order_status_created_idx',
+        )
+
+    def test_my_orders(self):
+        self.assertUsesIndex(
+            Order.objects.filter(customer=self.student).order_by('-created_at'),
+            'order_customer_created_idx',
+        )
+
+    def test_menu_category(self):
+        self.assertUsesIndex(
+            Dish.objects.filter(is_available=True, category=self.category).order_by('name'),
+            'dish_available_idx',
+        )
+
+
+class OrderPaginationTests(CanteenTestCase):
+
+    def create_orders(self, count):
+        orders = Order.objects.bulk_create(
+            Order(customer=self.student, status='ready') for _ in range(count)
+        )
+        # Одинаковое время у всех заказов - порядок держится на id
+        Order.objects.update(created_at=orders[0].created_at)
+        return orders
+
+    def test_pages_cover_all_orders_once(self):
+        self.create_orders(45)
+        seen = []
+        cursor = None
+        while True:
+            page = paginate_orders(Order.objects.all(), cursor, page_size=20)
+            seen.extend(order.id for order in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, sorted(Order.objects.values_list('id', flat=True), reverse=True))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            paginate_orders(Order.objects.all(), 'испорчен')
+
+    def test_api_returns_next_cursor(self):
+        self.create_orders(25)
+        self.client.force_login(self.student)
+        data = self.client.get(reverse('my_orders_api')).json()
+        self.assertEqual(len(data['results']), 20)
+        data = self.client.get(reverse('my_orders_api'), {'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_manage_orders_page(self):
+        self.create_orders(3)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('manage_orders'))
+        self.assertEqual(len(response.context['orders']), 3)
+
+
+@skipUnless(os.environ.get('CANTEEN_BENCHMARK'), 'Бенчмарк: CANTEEN_BENCHMARK=1 python manage.py test orders')
+class OrderHistoryBenchmark(CanteenTestCase):
+    """Время страницы истории на глубине 0 и ~90% для 500 тыс. заказов"""
+    ORDERS = 500_000
+
+    def timed(self, func, repeat=20):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[repeat // 2]
+
+    def test_deep_keyset_page_costs_the_same(self):
+        for _ in range(self.ORDERS // 10_000):
+            Order.objects.bulk_create(
+                (Order(customer=self.student, status='ready') for _ in range(10_000)),
+                batch_size=2_000,
+            )
+        queryset = Order.objects.all()
+        depth = int(self.ORDERS * 0.9)
+        deep_cursor = encode_cursor(queryset.order_by('-created_at', '-id')[depth - 1])
+
+        first = self.timed(lambda: paginate_orders(queryset))
+        deep = self.timed(lambda: paginate_orders(queryset, deep_cursor))
+        offset = self.timed(lambda: list(queryset.order_by('-created_at', '-id')[depth:depth + 20]), repeat=3)
+        print(f'\nпервая страница: {first * 1000:.2f} мс, '
+              f'глубина {depth} по курсору: {deep * 1000:.2f} мс, '
+              f'та же глубина через OFFSET: {offset * 1000:.2f} мс')
+        self.assertLess(deep, first * 3 + 0.005)
+
+
+@skipUnless(os.environ.get('CANTEEN_BENCHMARK'), 'Бенчмарк: CANTEEN_BENCHMARK=1 python manage.py test orders')
+class SessionBackendBenchmark(CanteenTestCase):
+    """Записи в базу и время одного клика "в корзину" для каждого хранилища сессий"""
+    CLICKS = 200
+
+    def test_writes_per_click(self):
+        for backend in ('db', 'cached_db', 'cache'):
+            with self.settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{backend}'):
+                client = Client()
+                client.force_login(self.student)
+                timings = []
+                with CaptureQueriesContext(connection) as ctx:
+                    for i in range(self.CLICKS):
+                        start = time.perf_counter()
+                        client.post(reverse('add_to_cart', args=[self.dishes[i % 10].id]))
+                        timings.append(time.perf_counter() - start)
+                writes = [q for q in ctx.captured_queries
+                          if q['sql'].startswith(('INSERT', 'UPDATE')) and 'django_session' in q['sql']]
+                print(f'\n{backend:>9}: записей в django_session на клик {len(writes) / self.CLICKS:.2f}, '
+                      f'медиана {sorted(timings)[self.CLICKS // 2] * 1000:.2f} мс, '
+                      f'корзина в сессии: {len(client.session["cart"])} символов')
+                if backend == 'cache':
+                    self.assertEqual(writes, [])
+
+
+class SeedAndLoadCommandsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_then_load(self):
+        call_command('seed_canteen', students=5, chefs=1, categories=2, dishes=6, orders=30,
+                     batch_size=7, random_seed=1, stdout=StringIO())
+        self.assertEqual(CustomUser.objects.filter(role='student').count(), 5)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertFalse(Order.objects.filter(items__isnull=True).exists())
+
+        out = StringIO()
+        call_command('load_canteen', flows=3, concurrency=1, host='testserver', random_seed=1, stdout=out)
+        report = out.getvalue()
+        self.assertIn('create_order', report)
+        self.assertNotIn('ошибкой', report)
+        self.assertGreaterEqual(Order.objects.filter(status='ready').count(), 3)
+
+
+class OrderTransitionTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(customer=self.student, status='preparing', notes='заметка')
+
+    def test_only_status_and_updated_at_are_written(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(self.order.transition('ready'))
+        sql = next(query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE'))
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertIn('"status"', sql)
+        self.assertNotIn('"notes"', sql)
+        self.assertNotIn('"total_price"', sql)
+
+    def test_second_writer_loses_the_race(self):
+        chef_copy = Order.objects.get(pk=self.order.pk)
+        admin_copy = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(chef_copy.transition('ready'))
+        self.assertFalse(admin_copy.transition('cancelled'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ready')
+
+    def test_invalid_transition(self):
+        with self.assertRaises(ValueError):
+            self.order.transition('pending')
+
+    def test_bulk_transition_returns_winners(self):
+        others = [Order.objects.create(customer=self.student, status='preparing') for _ in range(3)]
+        others[0].transition('cancelled')
+        ids = [self.order.id] + [order.id for order in others]
+        with CaptureQueriesContext(connection) as ctx:
+            changed = Order.bulk_transition(ids, 'preparing', 'ready')
+        updates = [query for query in ctx.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(sorted(changed), sorted([self.order.id, others[1].id, others[2].id]))
+
+    def test_manage_orders_rejects_unknown_status(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('manage_orders'), {'order_id': self.order.id, 'status': 'взломан'})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'preparing')
+
+    def test_chef_marks_many_ready(self):
+        other = Order.objects.create(customer=self.student, status='preparing')
+        self.client.force_login(self.chef)
+        self.client.post(reverse('chef_mark_ready'), {'order_ids': [self.order.id, other.id]})
+        self.assertEqual(Order.objects.filter(status='ready').count(), 2)
+
+    def test_status_change_publishes_event(self):
+        broker = mock.Mock()
+        with mock.patch.object(events, 'get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order.transition('ready')
+        self.assertEqual(broker.publish.call_args.args[0]['data'], {'id': self.order.id, 'status': 'ready'})
+
+
+class OrderItemsSummaryTests(CanteenTestCase):
+
+    def test_long_summary_is_truncated(self):
+        order = Order(customer=self.student)
+        order.set_items_summary([(dish.name, 1) for dish in self.dishes])
+        self.assertEqual(order.item_count, 50)
+        self.assertEqual(len(order.items_summary), 255)
+        self.assertTrue(order.items_summary.endswith('…'))
+
+    def test_backfill_command(self):
+        old = Order.objects.create(customer=self.student, status='ready')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=old, dish=self.dishes[0], quantity=2, price_at_time=1),
+            OrderItem(order=old, dish=self.dishes[1], quantity=1, price_at_time=1),
+        ])
+        empty = Order.objects.create(customer=self.student, status='cancelled')
+        call_command('backfill_order_summaries', batch_size=1, stdout=StringIO())
+        old.refresh_from_db()
+        self.assertEqual((old.item_count, old.items_summary), (3, 'Блюдо 0 ×2, Блюдо 1 ×1'))
+        empty.refresh_from_db()
+        self.assertEqual(empty.items_summary, '')
+
+    def test_list_pages_do_not_load_items(self):
+        place_order(self.student, self.cart_for(self.dishes[:3]))
+        for user, name in ((self.student, 'my_orders'), (self.admin, 'manage_orders'), (self.chef, 'chef_orders')):
+            with self.subTest(url=name):
+                self.client.force_login(user)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(name))
+                self.assertContains(response, 'Блюдо 0 ×2')
+                self.assertFalse([q for q in ctx.captured_queries if 'orders_orderitem' in q['sql']])
+
+
+class ImageVariantsTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, name='borsch.jpg', size=(1200, 900)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_builds_hashed_variants_next_to_original(self):
+        dish = self.dishes[0]
+        dish.image = self.upload()
+        dish.save()
+        variants = Dish.objects.get(pk=dish.pk).image_variants
+        self.assertEqual(variants['source'], dish.image.name)
+        self.assertEqual([width for width, _ in variants['webp']], [320, 640, 960])
+        self.assertEqual(variants['size'], [960, 720])
+        for width, name in variants['webp'] + variants['jpeg']:
+            self.assertTrue(default_storage.exists(name))
+            self.assertRegex(name, rf'^dishes/borsch\.[0-9a-f]{{12}}\.{width}w\.(webp|jpeg)$')
+
+        with mock.patch('myproject.images.build_variants') as build:
+            dish.save()
+        build.assert_not_called()
+
+    def test_small_image_is_not_upscaled_and_avatar_is_square(self):
+        self.student.avatar = self.upload('me.jpg', size=(250, 400))
+        self.student.save()
+        self.assertEqual([width for width, _ in self.student.avatar_variants['jpeg']], [100, 200])
+        self.assertEqual(self.student.avatar_variants['size'], [200, 200])
+
+    def test_broken_image_keeps_original(self):
+        dish = self.dishes[0]
+        dish.image = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+        with self.assertLogs('myproject.images', 'WARNING'):
+            dish.save()
+        self.assertEqual(dish.image_variants, {'source': dish.image.name, 'failed': True})
+        # Неудача записана - следующие сохранения не пытаются снова
+        with mock.patch('myproject.images.build_variants') as build:
+            dish.save()
+        build.assert_not_called()
+        self.assertIn('<img src="/media/dishes/broken', self.client.get(reverse('menu')).content.decode())
+
+    def test_replaced_image_variants_are_deleted(self):
+        dish = self.dishes[0]
+        dish.image = self.upload()
+        dish.save()
+        old = [name for _, name in dish.image_variants['webp'] + dish.image_variants['jpeg']]
+        dish.image = self.upload('shchi.jpg', size=(800, 600))
+        with self.captureOnCommitCallbacks(execute=True):
+            dish.save()
+        self.assertFalse([name for name in old if default_storage.exists(name)])
+        for _, name in dish.image_variants['jpeg']:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_menu_renders_lazy_picture(self):
+        dish = self.dishes[0]
+        dish.image = self.upload()
+        dish.save()
+        response = self.client.get(reverse('menu'))
+        self.assertContains(response, '<source type="image/webp" srcset="/media/dishes/borsch.')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_command(self):
+        name = default_storage.save('dishes/old.jpg', self.upload())
+        Dish.objects.filter(pk=self.dishes[0].pk).update(image=name)
+        out = StringIO()
+        call_command('build_image_variants', processes=2, stdout=out, stderr=StringIO())
+        self.assertIn('Готово: 1', out.getvalue())
+        variants = Dish.objects.get(pk=self.dishes[0].pk).image_variants
+        self.assertEqual(variants['source'], name)
+        self.assertEqual(len(variants['webp']), 3)
+
+
+class MenuImportExportTests(CanteenTestCase):
+
+    def import_csv(self, text, **options):
+        path = os.path.join(self.tmpdir, 'menu.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        out = StringIO()
+        call_command('import_menu', path, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def test_upsert_creates_and_updates(self):
+        out = self.import_csv(
+            'category,name,description,price,is_available\n'
+            'Супы,Блюдо 0,Новое описание,99.90,нет\n'
+            'Напитки,Компот,,35,да\n'
+            'Супы,Блюдо 1,,10.5,1\n'
+        )
+        self.assertIn('новых блюд 1, изменено 2, без изменений 0, новых категорий 1, ошибок 0', out)
+        dish = Dish.objects.get(pk=self.dishes[0].pk)
+        self.assertEqual((dish.description, dish.price, dish.is_available), ('Новое описание', Decimal('99.90'), False))
+        self.assertEqual(Dish.objects.get(name='Компот').category.name, 'Напитки')
+        self.assertEqual(Dish.objects.count(), 51)
+
+    def test_dry_run_prints_diff_and_writes_nothing(self):
+        out = self.import_csv('category,name,price\nСупы,Блюдо 0,1\nДесерты,Торт,50\n', dry_run=True)
+        self.assertIn(f'~ Супы / Блюдо 0: price {self.dishes[0].price} -> 1.00', out)
+        self.assertIn('+ категория Десерты', out)
+        self.assertIn('+ Десерты / Торт', out)
+        self.assertFalse(Category.objects.filter(name='Десерты').exists())
+        self.assertEqual(Dish.objects.get(pk=self.dishes[0].pk).price, self.dishes[0].price)
+
+    def test_partial_columns_and_errors(self):
+        Dish.objects.filter(pk=self.dishes[0].pk).update(description='Старое')
+        out = self.import_csv('category,name,is_available\nСупы,Блюдо 0,0\nСупы,Новое,1\n,Без категории,1\n')
+        self.assertIn('изменено 1', out)
+        self.assertIn('ошибок 2', out)
+        dish = Dish.objects.get(pk=self.dishes[0].pk)
+        self.assertEqual((dish.description, dish.is_available), ('Старое', False))
+
+    def test_queries_do_not_grow_with_file_size(self):
+        def queries(count):
+            rows = ''.join(f'Супы,Блюдо {i},{i + 1}\n' for i in range(count))
+            with CaptureQueriesContext(connection) as ctx:
+                self.import_csv('category,name,price\n' + rows)
+            return len(ctx.captured_queries)
+        self.assertEqual(queries(5), queries(50))
+
+    def test_export_then_import_is_unchanged(self):
+        for fmt in menu_io.FORMATS:
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.tmpdir, f'menu.{fmt}')
+                call_command('export_menu', format=fmt, output=path)
+                out = StringIO()
+                call_command('import_menu', path, stdout=out, batch_size=7)
+                self.assertIn('новых блюд 0, изменено 0, без изменений 50', out.getvalue())
+
+    def test_upload_form(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('menu.jsonl', '{"category": "Супы", "name": "Уха", "price": "80"}\n'.encode())
+        response = self.client.post(reverse('import_menu_upload'), {'file': upload})
+        self.assertContains(response, 'новых блюд 1')
+        self.assertContains(response, '+ Супы / Уха')
+        self.assertTrue(Dish.objects.filter(name='Уха').exists())
+
+
+class DailySalesTests(CanteenTestCase):
+
+    def snapshot(self):
+        return list(DailySales.objects.order_by('date', 'dish_id').values_list(
+            'date', 'dish_id', 'orders', 'cancelled', 'quantity', 'revenue'))
+
+    def test_incremental_updates_match_rebuild(self):
+        orders = [
+            place_order(self.student, {self.dishes[0].id: 2, self.dishes[1].id: 1}),
+            place_order(self.student, {self.dishes[0].id: 1, self.dishes[2].id: 3}),
+            place_order(self.student, {self.dishes[1].id: 4}),
+            place_order(self.student, {self.dishes[2].id: 1}),
+        ]
+        orders[1].transition('cancelled')
+        Order.bulk_transition([orders[2].pk, orders[3].pk], 'preparing', 'cancelled')
+        incremental = self.snapshot()
+
+        today = timezone.localdate()
+        total = DailySales.objects.get(date=today, dish=None)
+        self.assertEqual((total.orders, total.cancelled, total.quantity), (4, 3, 3))
+        self.assertEqual(total.revenue, orders[0].total_price)
+        sales.rebuild(today, today)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_place_order_updates_rollup_in_constant_queries(self):
+        place_order(self.student, self.cart_for(self.dishes[:1]))
+        with CaptureQueriesContext(connection) as small:
+            place_order(self.student, self.cart_for(self.dishes[:2]))
+        with CaptureQueriesContext(connection) as large:
+            place_order(self.student, self.cart_for(self.dishes[:30]))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(DailySales.objects.get(dish=self.dishes[0]).orders, 3)
+
+    def test_rebuild_command(self):
+        place_order(self.student, self.cart_for(self.dishes[:3]))
+        old = place_order(self.student, self.cart_for(self.dishes[:1]))
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=90))
+        expected_days = {timezone.localdate(), timezone.localdate() - timedelta(days=90)}
+        DailySales.objects.all().delete()
+
+        call_command('rebuild_daily_sales', chunk_days=7, stdout=StringIO())
+        self.assertEqual(set(DailySales.objects.filter(dish=None).values_list('date', flat=True)), expected_days)
+        self.assertEqual(DailySales.objects.count(), 6)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_daily_sales', date_from='2026-13-01', stdout=StringIO())
+
+    def test_dashboard_reads_rollup(self):
+        place_order(self.student, self.cart_for(self.dishes[:2], quantity=1))
+        # Сводка не зависит от строк заказов
+        OrderItem.objects.all().delete()
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['revenue_today'], self.dishes[0].price + self.dishes[1].price)
+        self.assertEqual(stats['sales_days'][-1][1:4], (1, 0, 2))
+
+
+class ArchiveTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old = []
+        for i, (days, status) in enumerate(((400, 'ready'), (300, 'cancelled'), (200, 'preparing'), (10, 'ready'))):
+            order = place_order(self.student, {self.dishes[2 + i].id: 2, self.dishes[1].id: 1})
+            if status != 'preparing':
+                order.transition(status)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days))
+            self.old.append(order)
+        self.recent = place_order(self.student, self.cart_for(self.dishes[:1]))
+        today = timezone.localdate()
+        sales.rebuild(today - timedelta(days=400), today)
+
+    def archive(self):
+        out = StringIO()
+        call_command('archive_orders', days=180, batch_size=1, stdout=out)
+        return out.getvalue()
+
+    def test_moves_only_old_finished_orders(self):
+        out = StringIO()
+        call_command('archive_orders', days=180, dry_run=True, stdout=out)
+        self.assertIn('Будет перенесено заказов: 2', out.getvalue())
+
+        self.assertIn('Перенесено в архив заказов: 2', self.archive())
+        archived_ids = {self.old[0].pk, self.old[1].pk}
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), archived_ids)
+        self.assertFalse(Order.objects.filter(pk__in=archived_ids).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived_ids).exists())
+
+        archived = ArchivedOrder.objects.get(pk=self.old[1].pk)
+        self.assertEqual((archived.status, archived.total_price, archived.item_count),
+                         ('cancelled', self.old[1].total_price, 3))
+        self.assertEqual(sorted(archived.items.values_list('dish_name', 'quantity')),
+                         [(self.dishes[1].name, 1), (self.dishes[3].name, 2)])
+        self.assertIn('Перенесено в архив заказов: 0', self.archive())
+
+    def test_history_reads_live_and_archive(self):
+        expected = [self.recent.pk] + [order.pk for order in reversed(self.old)]
+        self.archive()
+        ids, cursor = [], None
+        while True:
+            with self.assertNumQueries(2):
+                page = archive.customer_history(self.student, cursor, page_size=2)
+            ids += [order.pk for order in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(ids, expected)
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('my_orders_api'))
+        self.assertEqual([row['id'] for row in response.json()['results']], expected)
+
+    def test_order_detail_shows_archived_order(self):
+        self.archive()
+        dish = self.dishes[2]
+        OrderItem.objects.filter(dish=dish).delete()
+        dish.delete()
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('order_detail', args=[self.old[0].pk]))
+        self.assertContains(response, dish.name)
+        self.assertEqual(self.client.get(reverse('order_detail', args=[999999])).status_code, 404)
+
+        other = CustomUser.objects.create_user('other', password='pass', role='student')
+        self.client.force_login(other)
+        self.assertRedirects(self.client.get(reverse('order_detail', args=[self.old[0].pk])), reverse('my_orders'))
+
+    def test_dashboard_counters_include_archive(self):
+        counters = ['total_orders', 'active_orders', 'ready_orders', 'cancelled_orders']
+        before = {key: get_dashboard_stats()[key] for key in counters}
+        self.archive()
+        cache.clear()
+        self.assertEqual({key: get_dashboard_stats()[key] for key in counters}, before)
+
+    def test_rollup_and_reports_include_archive(self):
+        day_from, day_to = timezone.localdate() - timedelta(days=400), timezone.localdate()
+        before = list(DailySales.objects.order_by('date', 'dish_id').values_list())
+        report = {name: list(reports.report_rows(name, day_from, day_to)[1]) for name in ('orders', 'students')}
+        self.archive()
+        self.assertEqual(list(DailySales.objects.order_by('date', 'dish_id').values_list()), before)
+        sales.rebuild(day_from, day_to)
+        self.assertEqual(
+            list(DailySales.objects.order_by('date', 'dish_id').values_list(
+                'date', 'dish_id', 'orders', 'cancelled', 'quantity', 'revenue')),
+            [row[1:] for row in before],
+        )
+        for name, rows in report.items():
+            with self.subTest(report=name):
+                self.assertEqual(list(reports.report_rows(name, day_from, day_to)[1]), rows)
+
+
+@skipUnless(np, 'Нужен пакет numpy')
+class DemandForecastTests(CanteenTestCase):
+
+    def test_train_per_weekday(self):
+        weeks = 8
+        sales_matrix = np.tile([10, 2, 2, 2, 2, 0, 0], (2, weeks)).astype(float)
+        # Второе блюдо появилось две недели назад - прежние нули не в счет
+        sales_matrix[1, :-14] = 0
+        is_open = np.tile([True] * 5 + [False] * 2, weeks)
+        # Праздник: в понедельник столовая не работала
+        is_open[7] = False
+        sales_matrix[:, 7] = 0
+
+        mean, std = forecast.train(sales_matrix, is_open)
+        np.testing.assert_allclose(mean, [[10, 2, 2, 2, 2, 0, 0]] * 2)
+        np.testing.assert_allclose(std, 0, atol=1e-12)
+
+    def test_recent_weeks_weigh_more(self):
+        sales_matrix = np.array([[4.0] + [0] * 6 + [8.0] + [0] * 6])
+        mean, std = forecast.train(sales_matrix, np.ones(14, dtype=bool), half_life=1)
+        # Вес прошлой недели вдвое меньше: (4 * 0.5 + 8) / 1.5
+        self.assertAlmostEqual(mean[0, 0], 20 / 3)
+        self.assertGreater(std[0, 0], 0)
+
+    def test_command_saves_forecast_for_chef_page(self):
+        today = timezone.localdate()
+        for weeks_ago, quantity in ((1, 3), (2, 5), (3, 4)):
+            order = place_order(self.student, {self.dishes[0].id: quantity, self.dishes[1].id: 1})
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(weeks=weeks_ago))
+        self.dishes[1].is_available = False
+        self.dishes[1].save()
+        sales.rebuild(today - timedelta(weeks=4), today)
+
+        call_command('forecast_demand', date=today.isoformat(), days=2, stdout=StringIO())
+        row = DemandForecast.objects.get()
+        self.assertEqual((row.date, row.dish_id), (today, self.dishes[0].id))
+        self.assertTrue(3 < row.expected < 5)
+        self.assertGreaterEqual(row.recommended, 4)
+
+        place_order(self.student, {self.dishes[0].id: 2})
+        self.client.force_login(self.chef)
+        response = self.client.get(reverse('chef_orders'))
+        self.assertEqual(response.context['forecast'], [{
+            'dish_id': self.dishes[0].id, 'dish_name': self.dishes[0].name, 'category_name': 'Супы',
+            'expected': row.expected, 'recommended': row.recommended, 'ordered': 2,
+        }])
+        self.assertContains(response, 'Прогноз на сегодня')
+
+        with self.assertRaises(CommandError):
+            call_command('forecast_demand', days=8, stdout=StringIO())
+
+
+class TimeSlotTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.slot = TimeSlot.objects.create(starts_at=now + timedelta(hours=2), ends_at=now + timedelta(hours=2, minutes=15),
+                                            capacity=5)
+
+    def test_preorder_reserves_and_releases_capacity(self):
+        order = place_order(self.student, {self.dishes[0].id: 2, self.dishes[1].id: 1}, slot_id=self.slot.pk)
+        self.assertEqual((order.status, order.slot_id), ('confirmed', self.slot.pk))
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 3)
+
+        with self.assertRaises(SlotUnavailable):
+            place_order(self.student, {self.dishes[2].id: 3}, slot_id=self.slot.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(DailySales.objects.get(dish=None).orders, 1)
+
+        second = place_order(self.student, {self.dishes[2].id: 2}, slot_id=self.slot.pk)
+        self.assertFalse(slots.bookable_slots().exists())
+        order.transition('cancelled')
+        second.transition('cancelled')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 0)
+
+    def test_slot_closes_before_start(self):
+        soon = TimeSlot.objects.create(starts_at=timezone.now() + timedelta(minutes=10),
+                                       ends_at=timezone.now() + timedelta(minutes=25), capacity=50)
+        self.assertEqual(list(slots.bookable_slots()), [self.slot])
+        with self.assertRaises(SlotUnavailable):
+            place_order(self.student, self.cart_for(self.dishes[:1]), slot_id=soon.pk)
+        with self.assertRaises(SlotUnavailable):
+            place_order(self.student, self.cart_for(self.dishes[:1]), slot_id=0)
+
+    def test_kitchen_queue_releases_due_orders_by_slot(self):
+        later = TimeSlot.objects.create(starts_at=self.slot.starts_at + timedelta(minutes=15),
+                                        ends_at=self.slot.ends_at + timedelta(minutes=15), capacity=5)
+        late = place_order(self.student, self.cart_for(self.dishes[:1], quantity=1), slot_id=later.pk)
+        early = place_order(self.student, self.cart_for(self.dishes[:1], quantity=1), slot_id=self.slot.pk)
+        immediate = place_order(self.student, self.cart_for(self.dishes[:1], quantity=1))
+
+        self.client.force_login(self.chef)
+        self.assertEqual([o.pk for o in self.client.get(reverse('chef_orders')).context['orders']], [immediate.pk])
+
+        # Слоты вот-вот начнутся, но страница повара сама ничего не пишет
+        TimeSlot.objects.update(starts_at=F('starts_at') - timedelta(hours=2))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('chef_orders'))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "orders_order"')])
+
+        out = StringIO()
+        call_command('release_slot_orders', stdout=out)
+        self.assertIn('Передано на кухню: 2', out.getvalue())
+        response = self.client.get(reverse('chef_orders'))
+        self.assertEqual([o.pk for o in response.context['orders']], [immediate.pk, early.pk, late.pk])
+
+    def test_create_order_view_with_slot(self):
+        self.client.force_login(self.student)
+        self.client.post(reverse('add_to_cart', args=[self.dishes[0].id]), {'quantity': '2'})
+        response = self.client.get(reverse('view_cart'))
+        self.assertContains(response, f'<option value="{self.slot.pk}">')
+
+        response = self.client.post(reverse('create_order'), {'slot': str(self.slot.pk)}, follow=True)
+        order = Order.objects.get()
+        self.assertEqual((order.slot, order.status), (self.slot, 'confirmed'))
+        self.assertContains(response, 'Время выдачи')
+
+        self.client.post(reverse('add_to_cart', args=[self.dishes[0].id]), {'quantity': '4'})
+        response = self.client.post(reverse('create_order'), {'slot': str(self.slot.pk)})
+        self.assertRedirects(response, reverse('view_cart'))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_create_slots_command(self):
+        TimeSlot.objects.all().delete()
+        call_command('create_slots', days=1, weekends=True, first='08:00', last='10:00', minutes=20,
+                     capacity=30, stdout=StringIO())
+        call_command('create_slots', days=1, weekends=True, first='08:00', last='10:00', minutes=20,
+                     capacity=30, stdout=StringIO())
+        starts = [timezone.localtime(slot.starts_at).strftime('%H:%M') for slot in TimeSlot.objects.all()]
+        self.assertEqual(starts, ['08:00', '08:20', '08:40', '09:00', '09:20', '09:40'])
+        with self.assertRaises(CommandError):
+            call_command('create_slots', first='12:00', last='08:00', stdout=StringIO())
+
+
+class StockTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Dish.objects.filter(pk__in=[self.dishes[0].pk, self.dishes[1].pk]).update(stock=3)
+
+    def test_order_takes_stock_and_sold_out_dish_leaves_menu(self):
+        self.client.get(reverse('menu'))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.student, {self.dishes[0].id: 3, self.dishes[1].id: 1, self.dishes[2].id: 5})
+        stock = dict(Dish.objects.filter(pk__in=[d.pk for d in self.dishes[:3]]).order_by('pk').values_list('pk', 'stock'))
+        self.assertEqual(list(stock.values()), [0, 2, None])
+        self.assertFalse(Dish.objects.get(pk=self.dishes[0].pk).is_available)
+        self.assertNotIn(self.dishes[0], self.client.get(reverse('menu')).context['dishes'])
+
+    def test_out_of_stock_rolls_back(self):
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(self.student, {self.dishes[0].id: 4, self.dishes[1].id: 1})
+        self.assertEqual(ctx.exception.dish_ids, [self.dishes[0].id])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(set(Dish.objects.filter(stock__isnull=False).values_list('stock', flat=True)), {3})
+
+    def test_admin_does_not_overwrite_stock(self):
+        dish = self.dishes[0]
+        url = reverse('admin:orders_dish_change', args=[dish.pk])
+        data = {'name': dish.name, 'description': 'x', 'price': '99', 'category': self.category.pk,
+                'is_available': 'on', 'new_stock': ''}
+        self.client.force_login(CustomUser.objects.create_superuser('root', password='pass'))
+        # Форма открыта, пока ученик покупает порцию
+        place_order(self.student, {dish.id: 1})
+        self.assertRedirects(self.client.post(url, data), reverse('admin:orders_dish_changelist'))
+        dish.refresh_from_db()
+        self.assertEqual((dish.price, dish.stock), (Decimal('99'), 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {**data, 'new_stock': '0'})
+        dish.refresh_from_db()
+        self.assertEqual((dish.stock, dish.is_available), (0, False))
+        # Включить распроданное блюдо нельзя - ни в форме, ни в списке
+        response = self.client.post(url, data, follow=True)
+        self.assertContains(response, 'снято с продажи')
+        changelist = {'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1', 'form-0-id': dish.pk,
+                      'form-0-price': '99', 'form-0-is_available': 'on', '_save': 'Сохранить'}
+        response = self.client.post(reverse('admin:orders_dish_changelist'), changelist, follow=True)
+        self.assertContains(response, 'снято с продажи')
+        dish.refresh_from_db()
+        self.assertFalse(dish.is_available)
+
+        self.client.post(url, {**data, 'untrack_stock': 'on'})
+        dish.refresh_from_db()
+        self.assertEqual((dish.stock, dish.is_available), (None, True))
+
+    def test_failed_cancel_side_effect_rolls_back_status(self):
+        order = place_order(self.student, {self.dishes[0].id: 3})
+        other = place_order(self.student, {self.dishes[1].id: 1})
+        with mock.patch('orders.signals.restock', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                order.transition('cancelled')
+            with self.assertRaises(RuntimeError):
+                Order.bulk_transition([other.pk], 'preparing', 'cancelled')
+        self.assertEqual(order.status, 'preparing')
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'preparing'})
+        self.assertEqual(DailySales.objects.get(dish=None).cancelled, 0)
+
+    def test_cancel_returns_stock(self):
+        order = place_order(self.student, {self.dishes[0].id: 3, self.dishes[2].id: 1})
+        order.transition('cancelled')
+        dish = Dish.objects.get(pk=self.dishes[0].pk)
+        # Порции вернулись, но снова включать блюдо решает повар
+        self.assertEqual((dish.stock, dish.is_available), (3, False))
+
+    def test_query_count_does_not_grow_with_tracked_dishes(self):
+        Dish.objects.update(stock=100)
+        counts = {}
+        for size in (1, 10, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(self.student, self.cart_for(self.dishes[:size]))
+            counts[size] = len(ctx.captured_queries)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_create_order_view_reports_shortage(self):
+        self.client.force_login(self.student)
+        session = self.client.session
+        session['cart'] = {str(self.dishes[0].id): 5}
+        session.save()
+        response = self.client.post(reverse('create_order'), follow=True)
+        self.assertRedirects(response, reverse('view_cart'))
+        self.assertContains(response, 'Не хватает порций: Блюдо 0')
+        self.assertFalse(Order.objects.exists())
+
+
+class ReportsTests(CanteenTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = place_order(self.student, {self.dishes[0].id: 2, self.dishes[1].id: 1})
+        self.second = place_order(self.student, {self.dishes[0].id: 1})
+        self.cancelled = place_order(self.student, {self.dishes[2].id: 5})
+        self.cancelled.transition('cancelled')
+        old = place_order(self.student, {self.dishes[3].id: 1})
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        self.today = timezone.localdate()
+        # Дата заказа изменена задним числом - сводку продаж пересчитываем
+        sales.rebuild(self.today - timedelta(days=400), self.today)
+
+    def rows(self, report):
+        return list(reports.report_rows(report, self.today, self.today)[1])
+
+    def test_aggregates(self):
+        revenue = self.dishes[0].price * 3 + self.dishes[1].price
+        self.assertEqual(self.rows('daily'), [(self.today.isoformat(), 3, 1, 4, revenue)])
+        self.assertEqual(self.rows('dishes'), [
+            (self.dishes[0].name, 'Супы', 3, 2, self.dishes[0].price * 3),
+            (self.dishes[1].name, 'Супы', 1, 1, self.dishes[1].price),
+        ])
+        self.assertEqual(self.rows('students'), [('student', '', '', 2, 4, revenue)])
+        self.assertEqual(len(self.rows('orders')), 4)
+
+    def test_csv_export_streams(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reports_export'), {'report': 'orders', 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="orders_', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'Заказ,Дата,Ученик,Статус,Блюдо,Количество,Цена,Сумма')
+        self.assertEqual(len(lines), 5)
+        self.assertIn('Отменено', lines[-1])
+
+    def test_xlsx_export(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reports_export'), {'report': 'daily', 'format': 'xlsx',
+                                                               'date_from': '2000-01-01'})
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn(self.today.isoformat(), sheet)
+
+    def test_access_and_validation(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('reports_export')).status_code, 403)
+        self.client.force_login(self.admin)
+        for params in ({'date_from': 'вчера'}, {'date_from': '2026-02-10', 'date_to': '2026-02-01'},
+                       {'report': 'nope'}, {'format': 'pdf'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('reports_export'), params).status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'dishes.xlsx')
+            call_command('export_report', report='dishes', output=path)
+            with zipfile.ZipFile(path) as archive:
+                self.assertIn(self.dishes[0].name, archive.read('xl/worksheets/sheet1.xml').decode())
+        out = StringIO()
+        call_command('export_report', report='students', stdout=out)
+        self.assertIn('student,,,2,4,', out.getvalue())
+
+
+class KitchenSummaryTests(CanteenTestCase):
+
+    def test_quantities_are_summed_per_dish(self):
+        place_order(self.student, {str(self.dishes[0].id): 2, str(self.dishes[1].id): 1})
+        place_order(self.student, {str(self.dishes[0].id): 3})
+        done = place_order(self.student, {str(self.dishes[1].id): 5})
+        done.transition('ready')
+        with self.assertNumQueries(1):
+            summary = get_kitchen_summary()
+        self.assertEqual(
+            [(row['dish_id'], row['quantity'], row['orders']) for row in summary],
+            [(self.dishes[0].id, 5, 2), (self.dishes[1].id, 1, 1)],
+        )
+        self.assertEqual(summary[0]['category_name'], self.category.name)
+
+    def test_cache_is_dropped_after_new_order(self):
+        self.assertEqual(get_kitchen_summary(), [])
+        with self.assertNumQueries(0):
+            get_kitchen_summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.student, self.cart_for(self.dishes[:1]))
+        self.assertEqual(get_kitchen_summary()[0]['quantity'], 2)
+
+    def test_api(self):
+        place_order(self.student, self.cart_for(self.dishes[:2]))
+        self.client.force_login(self.chef)
+        data = self.client.get(reverse('kitchen_summary_api')).json()
+        self.assertEqual(len(data['results']), 2)
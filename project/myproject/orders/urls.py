@@ -7,8 +7,13 @@ urlpatterns = [
     path('cart/add/<int:dish_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:dish_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:dish_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('api/cart/', views.cart_api, name='cart_api'),
+    path('api/cart/add/<int:dish_id>/', views.cart_add_api, name='cart_add_api'),
+    path('api/cart/update/<int:dish_id>/', views.cart_update_api, name='cart_update_api'),
+    path('api/cart/remove/<int:dish_id>/', views.cart_remove_api, name='cart_remove_api'),
     path('order/create/', views.create_order, name='create_order'),
     path('orders/', views.my_orders, name='my_orders'),
+    path('api/orders/', views.my_orders_api, name='my_orders_api'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
     path('order/cancel/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('order/<int:order_id>/update_status/', views.update_order_status, name='update_order_status'),
@@ -16,9 +21,17 @@ urlpatterns = [
     # Админские URL
     path('manage/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('manage/dishes/', views.manage_dishes, name='manage_dishes'),
+    path('manage/dishes/import/', views.import_menu_upload, name='import_menu_upload'),
+    path('manage/orders/', views.manage_orders, name='manage_orders'),
     path('manage/users/', views.manage_users, name='manage_users'),
+    path('manage/reports/', views.reports_page, name='reports'),
+    path('manage/reports/export/', views.reports_export, name='reports_export'),
     path('manage/users/<int:user_id>/change_role/', views.change_user_role, name='change_user_role'),
     
     # Для повара
     path('chef/orders/', views.chef_orders, name='chef_orders'),
+    path('chef/orders/events/', views.kitchen_events, name='kitchen_events'),
+    path('chef/orders/ready/', views.chef_mark_ready, name='chef_mark_ready'),
+    path('chef/summary/', views.kitchen_summary, name='kitchen_summary'),
+    path('api/kitchen/summary/', views.kitchen_summary_api, name='kitchen_summary_api'),
 ]
@@ -1,11 +1,34 @@
+import asyncio
+import io
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView
 from django.core.exceptions import PermissionDenied
-from .models import Dish, Order, OrderItem, Category
+from django.utils import timezone
+from .models import Dish, Order, Category
 from users.models import CustomUser
 from .utils import user_can_order
+from .services import place_order, DishUnavailable, OutOfStock
+from .menu_cache import get_menu
+from .cart import MAX_CART_QUANTITY, Cart
+from .dashboard import get_dashboard_stats
+from .pagination import paginate_orders
+from .kitchen import get_day_forecast, get_kitchen_summary
+from . import archive, events, menu_io, reports, slots
+from myproject import xlsx
+
+logger = logging.getLogger(__name__)
 
 class MenuView(ListView):
     model = Dish
@@ -13,150 +36,199 @@ class MenuView(ListView):
     context_object_name = 'dishes'
     
     def get_queryset(self):
-        queryset = Dish.objects.filter(is_available=True).select_related('category')
-        category_id = self.request.GET.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        return queryset
+        # Меню берется из кэша (menu_cache.py), без запросов к базе
+        category_id = self.request.GET.get('category', '')
+        category_id = int(category_id) if category_id.isdigit() else None
+        self.menu = get_menu(category_id)
+        return self.menu['dishes']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        cart = self.request.session.get('cart', {})
-        context['cart_count'] = len(cart)
+        context['categories'] = self.menu['categories']
+        context['cart_count'] = len(Cart(self.request.session))
         return context
 
+def _quantity(value, default=0):
+    """Количество из формы: не число - default, сверху ограничено MAX_CART_QUANTITY"""
+    if not value or not value.isdigit():
+        return default
+    return min(int(value), MAX_CART_QUANTITY)
+
 @login_required
 def add_to_cart(request, dish_id):
     dish = get_object_or_404(Dish, id=dish_id, is_available=True)
-    cart = request.session.get('cart', {})
-    dish_id_str = str(dish_id)
-    
-    if dish_id_str in cart:
-        cart[dish_id_str] += 1
-    else:
-        cart[dish_id_str] = 1
-    
-    request.session['cart'] = cart
+    Cart(request.session).add(dish.id, _quantity(request.POST.get('quantity'), 1) or 1)
     messages.success(request, f'"{dish.name}" добавлено в корзину')
     return redirect('menu')
 
 @login_required
 def view_cart(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
+    cart_items, total, unavailable = Cart(request.session).load()
     
-    for dish_id_str, quantity in cart.items():
-        try:
-            dish_id = int(dish_id_str)
-            dish = Dish.objects.get(id=dish_id, is_available=True)
-            item_total = dish.price * quantity
-            cart_items.append({
-                'dish': dish,
-                'quantity': quantity,
-                'total': item_total
-            })
-            total += item_total
-        except (Dish.DoesNotExist, ValueError):
-            continue
+    if unavailable:
+        messages.warning(request, f'Больше недоступны и убраны из корзины: {", ".join(unavailable)}')
     
     return render(request, 'orders/cart.html', {
         'cart_items': cart_items,
-        'total': total
+        'total': total,
+        'slots': slots.bookable_slots(),
     })
 
 @login_required
 def update_cart(request, dish_id):
-    cart = request.session.get('cart', {})
-    dish_id_str = str(dish_id)
-    
     if request.method == 'POST':
-        quantity = request.POST.get('quantity')
-        if quantity and quantity.isdigit():
-            quantity = int(quantity)
-            if quantity > 0:
-                cart[dish_id_str] = quantity
-            else:
-                cart.pop(dish_id_str, None)
-        else:
-            cart.pop(dish_id_str, None)
+        Cart(request.session).update(dish_id, _quantity(request.POST.get('quantity')))
     
-    request.session['cart'] = cart
     return redirect('view_cart')
 
 @login_required
 def remove_from_cart(request, dish_id):
-    cart = request.session.get('cart', {})
-    dish_id_str = str(dish_id)
-    
-    if dish_id_str in cart:
-        del cart[dish_id_str]
-        request.session['cart'] = cart
+    if Cart(request.session).remove(dish_id):
         messages.success(request, 'Блюдо удалено из корзины')
     
     return redirect('view_cart')
 
+def _on_menu(dish_id):
+    """Блюдо доступно - по снимку меню из кэша, без запроса к базе"""
+    return any(dish.id == dish_id for dish in get_menu()['dishes'])
+
+def _cart_json(cart, dish_id=None):
+    """Итог корзины и, если задано блюдо, его строка - цены из кэша меню"""
+    lines, total = cart.summary()
+    data = {'count': len(cart), 'total': total}
+    if dish_id is not None:
+        line = lines.get(dish_id, {'quantity': 0, 'total': Decimal('0')})
+        data['line'] = {'dish_id': dish_id, **line}
+    return JsonResponse(data)
+
+@login_required
+def cart_api(request):
+    """Корзина в JSON: строки, итог и число позиций"""
+    cart = Cart(request.session)
+    lines, total = cart.summary()
+    return JsonResponse({
+        'count': len(cart),
+        'total': total,
+        'lines': [{'dish_id': dish_id, **line} for dish_id, line in lines.items()],
+    })
+
+@login_required
+@require_POST
+def cart_add_api(request, dish_id):
+    """Добавить в корзину без редиректа и перерисовки меню"""
+    if not _on_menu(dish_id):
+        return JsonResponse({'error': 'Блюдо недоступно'}, status=404)
+    cart = Cart(request.session)
+    cart.add(dish_id, _quantity(request.POST.get('quantity'), 1) or 1)
+    return _cart_json(cart, dish_id)
+
+@login_required
+@require_POST
+def cart_update_api(request, dish_id):
+    """Задать количество; 0 убирает блюдо"""
+    quantity = _quantity(request.POST.get('quantity'))
+    # Убрать можно любое блюдо, положить - только доступное
+    if quantity and not _on_menu(dish_id):
+        return JsonResponse({'error': 'Блюдо недоступно'}, status=404)
+    cart = Cart(request.session)
+    cart.update(dish_id, quantity)
+    return _cart_json(cart, dish_id)
+
+@login_required
+@require_POST
+def cart_remove_api(request, dish_id):
+    cart = Cart(request.session)
+    cart.remove(dish_id)
+    return _cart_json(cart, dish_id)
+
 @login_required
 def create_order(request):
-    """Создание заказа из корзины - сразу со статусом 'preparing'"""
+    """Создание заказа из корзины: сразу на кухню ('preparing') или предзаказ на слот"""
     if not hasattr(request.user, 'role') or request.user.role != 'student':
         messages.error(request, 'Только ученики могут оформлять заказы')
         return redirect('menu')
     
-    cart = request.session.get('cart', {})
+    cart = Cart(request.session)
     
     if not cart:
         messages.warning(request, 'Ваша корзина пуста')
         return redirect('menu')
     
+    # Пустое значение - заказ "сейчас"
+    slot_id = request.POST.get('slot', '')
+    slot_id = int(slot_id) if slot_id.isdigit() else None
     try:
-        order = Order.objects.create(
-            customer=request.user,
-            status='preparing',
-            total_price=0
-        )
+        order = place_order(request.user, cart.quantities(), slot_id=slot_id)
         
-        total = 0
-        for dish_id_str, quantity in cart.items():
-            dish_id = int(dish_id_str)
-            dish = Dish.objects.get(id=dish_id, is_available=True)
-            
-            OrderItem.objects.create(
-                order=order,
-                dish=dish,
-                quantity=quantity,
-                price_at_time=dish.price
-            )
-            total += dish.price * quantity
+        cart.clear()
         
-        order.total_price = total
-        order.save()
-        
-        request.session['cart'] = {}
-        
-        messages.success(request, f'Заказ #{order.id} успешно оформлен! Начато приготовление.')
+        if order.slot_id:
+            messages.success(request, f'Предзаказ #{order.id} оформлен на {order.slot}. Кухня начнет готовить к началу перемены.')
+        else:
+            messages.success(request, f'Заказ #{order.id} успешно оформлен! Начато приготовление.')
         return redirect('order_detail', order_id=order.id)
         
-    except Dish.DoesNotExist:
+    except OutOfStock as e:
+        names = ', '.join(Dish.objects.filter(pk__in=e.dish_ids).values_list('name', flat=True))
+        messages.error(request, f'Не хватает порций: {names}. Уменьшите количество или выберите другие блюда')
+        return redirect('view_cart')
+    except DishUnavailable:
         messages.error(request, 'Некоторые блюда больше не доступны')
         return redirect('view_cart')
+    except slots.SlotUnavailable:
+        messages.error(request, 'В выбранное время кухня уже занята - выберите другой слот')
+        return redirect('view_cart')
     except Exception as e:
         messages.error(request, f'Ошибка при оформлении заказа: {str(e)}')
         return redirect('view_cart')
 
+def _orders_page(request, queryset):
+    """Страница заказов по курсору из ?cursor=; испорченный курсор - первая страница"""
+    try:
+        return paginate_orders(queryset, request.GET.get('cursor'))
+    except ValueError:
+        return paginate_orders(queryset)
+
 @login_required
 def my_orders(request):
     try:
-        orders = Order.objects.filter(customer=request.user).order_by('-created_at')
+        # Вместе с архивом: старые заказы лежат в ArchivedOrder (orders/archive.py)
+        try:
+            orders = archive.customer_history(request.user, request.GET.get('cursor'))
+        except ValueError:
+            orders = archive.customer_history(request.user)
         return render(request, 'orders/my_orders.html', {'orders': orders})
     except Exception as e:
         messages.error(request, f'Ошибка загрузки заказов: {str(e)}')
         return redirect('menu')
 
+@login_required
+def my_orders_api(request):
+    """История заказов в JSON, постранично по курсору"""
+    try:
+        page = archive.customer_history(request.user, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': order.id,
+                'status': order.status,
+                'status_display': order.get_status_display(),
+                'total_price': order.total_price,
+                'created_at': order.created_at,
+            }
+            for order in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = archive.find_order(order_id)
+    if order is None:
+        raise Http404('Заказ не найден')
     
     if not hasattr(request.user, 'role') or (request.user.role != 'admin' and order.customer != request.user):
         messages.error(request, 'У вас нет прав для просмотра этого заказа')
@@ -164,16 +236,22 @@ def order_detail(request, order_id):
     
     return render(request, 'orders/order_detail.html', {'order': order})
 
+def _change_status(request, order, new_status):
+    """Условный переход статуса с сообщением для пользователя"""
+    if not order.can_transition(new_status):
+        messages.error(request, f'Невозможно перевести заказ #{order.id} из статуса "{order.get_status_display()}"')
+        return False
+    if not order.transition(new_status):
+        messages.error(request, f'Заказ #{order.id} уже изменен другим пользователем')
+        return False
+    return True
+
 @login_required
 def cancel_order(request, order_id):
     order = get_object_or_404(Order, id=order_id, customer=request.user)
     
-    if order.status in ['pending', 'preparing']:
-        order.status = 'cancelled'
-        order.save()
+    if _change_status(request, order, 'cancelled'):
         messages.success(request, f'Заказ #{order.id} отменен')
-    else:
-        messages.error(request, 'Невозможно отменить заказ в текущем статусе')
     
     return redirect('my_orders')
 
@@ -183,20 +261,46 @@ def admin_dashboard(request):
         messages.error(request, 'Доступно только для администраторов')
         return redirect('menu')
     
-    total_customers = CustomUser.objects.filter(role='customer').count()
-    total_chefs = CustomUser.objects.filter(role='chef').count()
-    total_dishes = Dish.objects.count()
-    total_orders = Order.objects.count()
-    active_orders = Order.objects.exclude(status__in=['delivered', 'cancelled']).count()
+    return render(request, 'orders/admin_dashboard.html', get_dashboard_stats())
+
+@login_required
+def reports_page(request):
+    """Форма выгрузки отчетов за период"""
+    if not request.user.is_admin():
+        messages.error(request, 'Доступно только для администраторов')
+        return redirect('menu')
     
-    context = {
-        'total_customers': total_customers,
-        'total_chefs': total_chefs,
-        'total_dishes': total_dishes,
-        'total_orders': total_orders,
-        'active_orders': active_orders,
-    }
-    return render(request, 'orders/admin_dashboard.html', context)
+    date_from, date_to = reports.parse_period(None, None)
+    return render(request, 'orders/reports.html', {
+        'reports': [(key, title) for key, (title, _, _) in reports.REPORTS.items()],
+        'formats': reports.FORMATS,
+        'date_from': date_from,
+        'date_to': date_to,
+    })
+
+@login_required
+def reports_export(request):
+    """Отчет файлом CSV или XLSX: строки идут клиенту по мере чтения из базы"""
+    if not request.user.is_admin():
+        raise PermissionDenied("Только для администраторов")
+    
+    report = request.GET.get('report', 'orders')
+    fmt = request.GET.get('format', 'csv')
+    try:
+        if fmt not in reports.FORMATS:
+            raise ValueError(f'Неизвестный формат: {fmt}')
+        date_from, date_to = reports.parse_period(request.GET.get('date_from'), request.GET.get('date_to'))
+        header, rows = reports.report_rows(report, date_from, date_to)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400, json_dumps_params={'ensure_ascii': False})
+    
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(xlsx.stream_xlsx(header, rows, reports.REPORTS[report][0]),
+                                         content_type=xlsx.CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(reports.stream_csv(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{reports.filename(report, date_from, date_to, fmt)}"'
+    return response
 
 @login_required
 def manage_dishes(request):
@@ -204,14 +308,49 @@ def manage_dishes(request):
         messages.error(request, 'Доступно только для администраторов')
         return redirect('menu')
     
+    return _render_manage_dishes(request)
+
+def _render_manage_dishes(request, **extra):
     dishes = Dish.objects.all().select_related('category')
     categories = Category.objects.all()
     
     return render(request, 'orders/manage_dishes.html', {
         'dishes': dishes,
         'categories': categories,
+        **extra,
     })
 
+# Сколько строк diff показывать на странице после загрузки
+IMPORT_DIFF_LINES = 200
+
+@login_required
+def import_menu_upload(request):
+    """Загрузка меню файлом - тот же движок, что у команды import_menu"""
+    if not request.user.is_admin():
+        raise PermissionDenied("Только для администраторов")
+    
+    upload = request.FILES.get('file')
+    if request.method != 'POST' or upload is None:
+        messages.error(request, 'Выберите файл CSV или JSON Lines')
+        return redirect('manage_dishes')
+    
+    diff = []
+    def on_diff(line):
+        if len(diff) < IMPORT_DIFF_LINES:
+            diff.append(line)
+    
+    importer = menu_io.MenuImport(dry_run=bool(request.POST.get('dry_run')), on_diff=on_diff)
+    stream = io.TextIOWrapper(upload.open('rb'), encoding='utf-8-sig', newline='')
+    try:
+        importer.run(menu_io.read_rows(stream, menu_io.guess_format(upload.name)))
+    except UnicodeDecodeError:
+        messages.error(request, 'Файл должен быть в кодировке UTF-8')
+        return redirect('manage_dishes')
+    finally:
+        stream.detach()
+    
+    return _render_manage_dishes(request, import_result=importer, import_diff=diff)
+
 @login_required
 def add_dish(request):
     if not request.user.is_admin():
@@ -272,18 +411,14 @@ def update_order_status(request, order_id):
         new_status = request.POST.get('status')
         
         if request.user.is_chef():
-            if order.status == 'preparing' and new_status == 'ready':
-                order.status = new_status
-                order.save()
-                messages.success(request, f'Заказ #{order.id} отмечен как готовый!')
-            else:
+            if new_status != 'ready':
                 messages.error(request, 'Невозможно изменить статус')
+            elif _change_status(request, order, 'ready'):
+                messages.success(request, f'Заказ #{order.id} отмечен как готовый!')
             return redirect('chef_orders')
         
         elif request.user.is_admin():
-            if new_status in dict(Order.STATUS_CHOICES):
-                order.status = new_status
-                order.save()
+            if _change_status(request, order, new_status):
                 messages.success(request, f'Статус заказа #{order.id} изменен')
             return redirect('admin_dashboard')
     
@@ -296,14 +431,98 @@ def chef_orders(request):
         messages.error(request, 'Доступно только для поваров')
         return redirect('menu')
     
-    orders = Order.objects.filter(status='preparing').select_related('customer').order_by('created_at')
+    # Предзаказы на кухню передает команда release_slot_orders (cron), не GET
+    # Состав берется из денормализованных полей заказа, позиции не загружаются.
+    # Заказы "сейчас" - первыми, предзаказы - по времени слота
+    orders = list(
+        Order.objects.filter(status='preparing').select_related('customer', 'slot')
+        .order_by(F('slot__starts_at').asc(nulls_first=True), 'created_at')
+    )
+    logger.debug('Очередь кухни загружена', extra={'chef_id': request.user.id, 'orders': len(orders)})
     
-    # Для отладки
-    print(f"Найдено заказов для повара: {orders.count()}")
-    for order in orders:
-        print(f"Заказ #{order.id}, статус: {order.status}, пользователь: {order.customer.username}")
+    return render(request, 'orders/chef_orders.html', {'orders': orders, 'forecast': get_day_forecast()})
+
+@login_required
+def kitchen_summary(request):
+    """Сколько порций каждого блюда готовить по всем заказам в работе"""
+    if not request.user.is_chef():
+        messages.error(request, 'Доступно только для поваров')
+        return redirect('menu')
     
-    return render(request, 'orders/chef_orders.html', {'orders': orders})
+    return render(request, 'orders/kitchen_summary.html', {'summary': get_kitchen_summary()})
+
+@login_required
+def kitchen_summary_api(request):
+    if not (request.user.is_chef() or request.user.is_admin()):
+        return JsonResponse({'error': 'Доступно только для поваров'}, status=403)
+    
+    return JsonResponse({'results': get_kitchen_summary()}, json_dumps_params={'ensure_ascii': False})
+
+@login_required
+def chef_mark_ready(request):
+    """Отметить несколько заказов готовыми одним UPDATE"""
+    if not request.user.is_chef():
+        messages.error(request, 'Доступно только для поваров')
+        return redirect('menu')
+    
+    if request.method == 'POST':
+        order_ids = [order_id for order_id in request.POST.getlist('order_ids') if order_id.isdigit()]
+        if order_ids:
+            changed = Order.bulk_transition(order_ids, 'preparing', 'ready')
+            messages.success(request, f'Готово заказов: {len(changed)}')
+            if len(changed) < len(order_ids):
+                messages.warning(request, f'Не изменено (уже обработаны): {len(order_ids) - len(changed)}')
+    
+    return redirect('chef_orders')
+
+# Раз в столько секунд поток доски кухни шлет ping и ищет переданные на кухню предзаказы
+KITCHEN_PING_SECONDS = 15
+
+async def kitchen_events(request):
+    """Поток событий заказов для доски кухни (Server-Sent Events).
+
+    Работает только под ASGI (myproject/asgi.py): каждый клиент - это
+    корутина, ожидающая очередь брокера, а не отдельный поток.
+    """
+    user = await request.auser()
+    if not user.is_authenticated or not user.is_chef():
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI бесконечный поток занял бы worker - клиент не переподключается на 204
+        return HttpResponse(status=204)
+    
+    broker = events.get_broker()
+    released_since = sync_to_async(slots.released_since)
+    
+    async def stream():
+        queue = broker.subscribe()
+        # Предзаказы передает на кухню release_slot_orders в другом процессе - его
+        # события до брокера этого процесса не доходят, поэтому поток ищет их сам
+        checked, sent = timezone.now(), set()
+        next_check = time.monotonic() + KITCHEN_PING_SECONDS
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=max(next_check - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    now = timezone.now()
+                    # Нахлест окна - на случай, если транзакция команды закоммитилась позже
+                    released = set(await released_since(checked - timedelta(seconds=5)))
+                    for order_id in sorted(released - sent):
+                        yield events.format_sse({'event': 'order_updated', 'data': {'id': order_id, 'status': 'preparing'}})
+                    checked, sent = now, released
+                    next_check = time.monotonic() + KITCHEN_PING_SECONDS
+                    yield ': ping\n\n'
+                    continue
+                yield events.format_sse(event)
+        finally:
+            broker.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required  
 def manage_orders(request):
@@ -311,8 +530,6 @@ def manage_orders(request):
         messages.error(request, 'Доступно только для администраторов')
         return redirect('menu')
     
-    orders = Order.objects.all().select_related('customer').order_by('-created_at')
-    
     if request.method == 'POST':
         order_id = request.POST.get('order_id')
         new_status = request.POST.get('status')
@@ -320,12 +537,13 @@ def manage_orders(request):
         if order_id and new_status:
             try:
                 order = Order.objects.get(id=order_id)
-                order.status = new_status
-                order.save()
-                messages.success(request, f'Статус заказа #{order_id} изменен')
-            except Order.DoesNotExist:
+                if _change_status(request, order, new_status):
+                    messages.success(request, f'Статус заказа #{order_id} изменен')
+            except (Order.DoesNotExist, ValueError):
                 messages.error(request, 'Заказ не найден')
     
+    orders = _orders_page(request, Order.objects.select_related('customer'))
+    
     context = {
         'orders': orders,
         'status_choices': Order.STATUS_CHOICES if hasattr(Order, 'STATUS_CHOICES') else [],
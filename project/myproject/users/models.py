@@ -11,6 +11,7 @@ class CustomUser(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     phone = models.CharField(max_length=15, blank=True)  # Добавить
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)  # Добавить
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     birth_date = models.DateField(blank=True, null=True)  # Добавить
     def is_admin(self):
         return self.role == 'admin'
@@ -81,7 +81,7 @@ def user_detail(request, user_id=None):
     else:
         user = request.user
     
-    return render(request, 'users/user_detail.html', {'user': user})
+    return render(request, 'users/user_details.html', {'user': user})
 def index(request):
     """Главная страница приложения users"""
     html = """